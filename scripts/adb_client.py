@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""Minimal pure-Python client for the ADB server (smart socket protocol).
+
+Talks to the adb server over TCP (default 127.0.0.1:5037) instead of forking
+the `adb` binary for every operation. Covers the host services we need
+(host:devices, host:transport), shell:/exec: streams and the sync protocol.
+
+The server address can be overridden with ANDROID_ADB_SERVER_ADDRESS and
+ANDROID_ADB_SERVER_PORT (same variables the real adb uses), which also makes
+it possible to point every script at a local fake server for offline testing.
+"""
+import asyncio
+import os
+import socket
+import shlex
+import stat as stat_mod
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Configuration
+ADB_PATH = "/home/linda/Android/Sdk/platform-tools/adb"
+ADB_HOST = os.environ.get("ANDROID_ADB_SERVER_ADDRESS", "127.0.0.1")
+ADB_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+
+SYNC_DATA_MAX = 64 * 1024
+# Max idle sync sessions kept open per device
+SYNC_POOL_SIZE = 4
+
+
+class AdbError(Exception):
+    """Raised when the server answers FAIL or the connection breaks."""
+
+
+class DirEntry:
+    """One entry from a sync STAT/LIST reply."""
+    __slots__ = ("name", "mode", "size", "mtime")
+
+    def __init__(self, name, mode, size, mtime):
+        self.name = name
+        self.mode = mode
+        self.size = size
+        self.mtime = mtime
+
+    @property
+    def is_dir(self):
+        return stat_mod.S_ISDIR(self.mode)
+
+    @property
+    def is_link(self):
+        return stat_mod.S_ISLNK(self.mode)
+
+    @property
+    def exists(self):
+        return self.mode != 0
+
+    def __repr__(self):
+        return f"DirEntry({self.name!r}, mode={self.mode:o}, size={self.size}, mtime={self.mtime})"
+
+
+def quote(arg):
+    """Quotes one argument for the device shell."""
+    return shlex.quote(str(arg))
+
+
+class AdbConnection:
+    """A single smart-socket connection to the adb server."""
+
+    def __init__(self, host=ADB_HOST, port=ADB_PORT, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def send_request(self, service):
+        """Sends a host/device service request and waits for OKAY."""
+        data = service.encode("utf-8")
+        self.sock.sendall(b"%04x" % len(data) + data)
+        self.read_status()
+
+    def read_status(self):
+        status = self.read_exactly(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_string())
+        raise AdbError(f"Unexpected server status: {status!r}")
+
+    def read_string(self):
+        """Reads a hex4 length-prefixed string."""
+        length = int(self.read_exactly(4), 16)
+        return self.read_exactly(length).decode("utf-8", errors="replace")
+
+    def read_exactly(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise AdbError("Connection closed by adb server")
+            buf += chunk
+        return bytes(buf)
+
+    def read_into(self, view):
+        """Reads exactly len(view) bytes into a writable memoryview."""
+        got = 0
+        while got < len(view):
+            n = self.sock.recv_into(view[got:])
+            if not n:
+                raise AdbError("Connection closed by adb server")
+            got += n
+
+    def recv(self, size=65536):
+        return self.sock.recv(size)
+
+    def read_all(self):
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def makefile(self, mode="rb"):
+        return self.sock.makefile(mode)
+
+    def close(self):
+        # shutdown() first so a thread blocked in recv (or a makefile reader) wakes up
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SyncConnection:
+    """A `sync:` session. Stays open for many STAT/LIST/RECV/SEND requests."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._hdr = bytearray(8)
+        self._hdr_view = memoryview(self._hdr)
+
+    def _send(self, cmd, arg):
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        self.conn.sendall(cmd + struct.pack("<I", len(arg)) + arg)
+
+    def _read_header(self):
+        self.conn.read_into(self._hdr_view)
+        return bytes(self._hdr[:4]), struct.unpack_from("<I", self._hdr, 4)[0]
+
+    def _fail(self, length):
+        raise AdbError(self.conn.read_exactly(length).decode("utf-8", errors="replace"))
+
+    def stat(self, path):
+        """Returns a DirEntry; mode == 0 means the path does not exist."""
+        self._send(b"STAT", path)
+        data = self.conn.read_exactly(16)
+        ident, mode, size, mtime = struct.unpack("<4sIII", data)
+        if ident != b"STAT":
+            raise AdbError(f"Bad STAT reply: {ident!r}")
+        return DirEntry(os.path.basename(path.rstrip("/")) or "/", mode, size, mtime)
+
+    def stat_many(self, paths, batch=256):
+        """stat() for many paths, pipelined: one round-trip per batch instead of per path."""
+        results = []
+        for start in range(0, len(paths), batch):
+            chunk = paths[start:start + batch]
+            requests = []
+            for path in chunk:
+                arg = path.encode("utf-8")
+                requests.append(b"STAT" + struct.pack("<I", len(arg)) + arg)
+            self.conn.sendall(b"".join(requests))
+            for path in chunk:
+                ident, mode, size, mtime = struct.unpack("<4sIII", self.conn.read_exactly(16))
+                if ident != b"STAT":
+                    raise AdbError(f"Bad STAT reply: {ident!r}")
+                results.append(DirEntry(os.path.basename(path.rstrip("/")) or "/", mode, size, mtime))
+        return results
+
+    def list(self, path):
+        """Lists a remote directory. Returns [DirEntry] without '.' and '..'."""
+        self._send(b"LIST", path)
+        entries = []
+        while True:
+            data = self.conn.read_exactly(20)
+            ident, mode, size, mtime, namelen = struct.unpack("<4sIIII", data)
+            if ident == b"DONE":
+                return entries
+            if ident == b"FAIL":
+                self._fail(namelen)
+            if ident != b"DENT":
+                raise AdbError(f"Bad LIST reply: {ident!r}")
+            name = self.conn.read_exactly(namelen).decode("utf-8", errors="replace")
+            if name in (".", ".."):
+                continue
+            entries.append(DirEntry(name, mode, size, mtime))
+
+    def pull(self, remote_path, local_file, progress=None):
+        """Streams a remote file into an open binary file object."""
+        self._send(b"RECV", remote_path)
+        buf = bytearray(SYNC_DATA_MAX)
+        view = memoryview(buf)
+        total = 0
+        while True:
+            ident, length = self._read_header()
+            if ident == b"DONE":
+                return total
+            if ident == b"FAIL":
+                self._fail(length)
+            if ident != b"DATA":
+                raise AdbError(f"Bad RECV reply: {ident!r}")
+            chunk = view[:length]
+            self.conn.read_into(chunk)
+            local_file.write(chunk)
+            total += length
+            if progress:
+                progress(total)
+
+    def push(self, local_file, remote_path, mode=0o644, mtime=None, progress=None):
+        """Streams an open binary file object to the device."""
+        if mtime is None:
+            mtime = int(time.time())
+        self._send(b"SEND", f"{remote_path},{mode | stat_mod.S_IFREG}")
+        total = 0
+        while True:
+            chunk = local_file.read(SYNC_DATA_MAX)
+            if not chunk:
+                break
+            self.conn.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+            total += len(chunk)
+            if progress:
+                progress(total)
+        self.conn.sendall(b"DONE" + struct.pack("<I", int(mtime)))
+        ident, length = self._read_header()
+        if ident == b"FAIL":
+            self._fail(length)
+        if ident != b"OKAY":
+            raise AdbError(f"Bad SEND reply: {ident!r}")
+        return total
+
+    def quit(self):
+        try:
+            self.conn.sendall(b"QUIT" + struct.pack("<I", 0))
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class ShellSession:
+    """One long-lived device shell that runs commands back to back.
+
+    Uses `exec:sh` (no pty, so no echo or CRLF rewriting). Each command is
+    followed by a unique end marker carrying its exit code. Requests are
+    serialized; a broken or timed-out session is reopened on the next call.
+    """
+
+    def __init__(self, client, serial):
+        self.client = client
+        self.serial = serial
+        self.conn = None
+        self._buf = bytearray()
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._seq = 0
+
+    def _open(self):
+        self.conn = self.client.open_exec(self.serial, "sh")
+        self._buf.clear()
+
+    def _discard(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _request(self, cmd, timeout):
+        self._seq += 1
+        marker = f"__PEPPER_END_{self._token}_{self._seq}__"
+        # stdin from /dev/null so the command cannot eat the following requests
+        script = f"( {cmd}\n) </dev/null 2>&1; printf '\\n%s %d\\n' {marker} $?\n"
+        self.conn.settimeout(timeout)
+        self.conn.sendall(script.encode("utf-8"))
+        buf = self._buf
+        tail = f"\n{marker} ".encode()
+        scan = 0
+        while True:
+            idx = buf.find(tail, scan)
+            if idx != -1:
+                end = buf.find(b"\n", idx + len(tail))
+                if end != -1:
+                    break
+            else:
+                # Only rescan what may hold a marker split across chunks
+                scan = max(0, len(buf) - len(tail))
+            chunk = self.conn.recv(65536)
+            if not chunk:
+                raise AdbError("Shell session closed")
+            buf += chunk
+        out = bytes(buf[:idx]).decode("utf-8", errors="replace")
+        rc = int(buf[idx + len(tail):end])
+        del buf[:end + 1]
+        return rc, out
+
+    def run(self, cmd, timeout=10):
+        """Runs cmd and returns (exit_code, output). stderr is merged into output."""
+        with self._lock:
+            reused = self.conn is not None
+            if not reused:
+                self._open()
+            try:
+                return self._request(cmd, timeout)
+            except (AdbError, OSError) as e:
+                self._discard()
+                # A session idle across a disconnect fails before any output:
+                # reconnect once. Timeouts are not retried.
+                if not reused or isinstance(e, socket.timeout) or self._buf:
+                    raise
+            self._open()
+            try:
+                return self._request(cmd, timeout)
+            except (AdbError, OSError):
+                self._discard()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._discard()
+
+
+class AdbClient:
+    """Entry point for talking to the adb server. Thread-safe."""
+
+    def __init__(self, host=ADB_HOST, port=ADB_PORT):
+        self.host = host
+        self.port = port
+        self._lock = threading.Lock()
+        self._sync_pool = {}  # serial -> [SyncConnection]
+        self._shells = {}  # serial -> ShellSession
+        self._server_checked = False
+
+    # --- Connections ---
+
+    def connect(self, timeout=None):
+        try:
+            return AdbConnection(self.host, self.port, timeout)
+        except ConnectionRefusedError:
+            if self._server_checked:
+                raise AdbError(f"adb server not reachable at {self.host}:{self.port}")
+            # Server not running yet: start it once, like the adb binary would
+            self._server_checked = True
+            self._start_server()
+            return AdbConnection(self.host, self.port, timeout)
+
+    def _start_server(self):
+        adb = ADB_PATH if os.path.exists(ADB_PATH) else "adb"
+        try:
+            subprocess.run([adb, "start-server"], capture_output=True, timeout=15)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise AdbError(f"Could not start adb server: {e}")
+
+    def transport(self, serial=None, timeout=None):
+        """Opens a connection already switched to the given device."""
+        conn = self.connect(timeout)
+        try:
+            conn.send_request(f"host:transport:{serial}" if serial else "host:transport-any")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    # --- Host services ---
+
+    def host_request(self, service, timeout=5):
+        """Runs a one-shot host service that answers with a length-prefixed string."""
+        with self.connect(timeout) as conn:
+            conn.send_request(service)
+            return conn.read_string()
+
+    def devices(self):
+        """Returns [(serial, state)] like `adb devices`."""
+        return parse_device_list(self.host_request("host:devices"))
+
+    def version(self):
+        return int(self.host_request("host:version"), 16)
+
+    # --- Device services ---
+
+    def open_service(self, serial, service, timeout=None):
+        """Opens a device service (e.g. 'shell:logcat') and returns the raw stream."""
+        conn = self.transport(serial, timeout)
+        try:
+            conn.send_request(service)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def open_shell(self, serial, cmd, timeout=None):
+        return self.open_service(serial, f"shell:{cmd}", timeout)
+
+    def open_exec(self, serial, cmd, timeout=None):
+        """Raw binary-safe stream (no pty, no CRLF mangling)."""
+        return self.open_service(serial, f"exec:{cmd}", timeout)
+
+    def shell(self, serial, cmd, timeout=10):
+        """Runs a shell command and returns its output as text."""
+        with self.open_shell(serial, cmd, timeout) as conn:
+            out = conn.read_all().decode("utf-8", errors="replace")
+        # Pre-N devices run `shell:` under a pty, which turns \n into \r\n
+        return out.replace("\r\n", "\n")
+
+    def shell_session(self, serial):
+        """Returns the persistent ShellSession for a device (created on first use)."""
+        with self._lock:
+            session = self._shells.get(serial)
+            if session is None:
+                session = self._shells[serial] = ShellSession(self, serial)
+            return session
+
+    # --- Sync protocol (pooled) ---
+
+    def _open_sync(self, serial):
+        return SyncConnection(self.open_service(serial, "sync:"))
+
+    @contextmanager
+    def sync(self, serial):
+        """Borrows a pooled sync session for the device."""
+        with self._lock:
+            pool = self._sync_pool.get(serial)
+            sync = pool.pop() if pool else None
+        if sync is None:
+            sync = self._open_sync(serial)
+        try:
+            yield sync
+        except BaseException:
+            # The session state is unknown after an error: never reuse it
+            sync.quit()
+            raise
+        else:
+            with self._lock:
+                pool = self._sync_pool.setdefault(serial, [])
+                if len(pool) < SYNC_POOL_SIZE:
+                    pool.append(sync)
+                    sync = None
+            if sync is not None:
+                sync.quit()
+
+    def drop_device(self, serial):
+        """Closes pooled sessions for a device (e.g. after it disconnects)."""
+        with self._lock:
+            pool = self._sync_pool.pop(serial, [])
+            session = self._shells.pop(serial, None)
+        for sync in pool:
+            sync.quit()
+        if session is not None:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            pools, self._sync_pool = self._sync_pool, {}
+            shells, self._shells = self._shells, {}
+        for pool in pools.values():
+            for sync in pool:
+                sync.quit()
+        for session in shells.values():
+            session.close()
+
+
+def parse_device_list(text):
+    """Parses the host:devices / track-devices payload into [(serial, state)]."""
+    devices = []
+    for line in text.splitlines():
+        if "\t" not in line:
+            continue
+        serial, state = line.split("\t", 1)
+        devices.append((serial.strip(), state.strip()))
+    return devices
+
+
+# --- asyncio variants (one event loop for many streams) ---
+
+async def _async_request(reader, writer, service):
+    data = service.encode("utf-8")
+    writer.write(b"%04x" % len(data) + data)
+    await writer.drain()
+    status = await reader.readexactly(4)
+    if status == b"FAIL":
+        length = int(await reader.readexactly(4), 16)
+        raise AdbError((await reader.readexactly(length)).decode("utf-8", errors="replace"))
+    if status != b"OKAY":
+        raise AdbError(f"Unexpected server status: {status!r}")
+
+
+async def open_service_async(serial, service, host=ADB_HOST, port=ADB_PORT):
+    """Opens a device service and returns asyncio (reader, writer) streams."""
+    reader, writer = await asyncio.open_connection(host, port, limit=1024 * 1024)
+    try:
+        await _async_request(reader, writer, f"host:transport:{serial}" if serial else "host:transport-any")
+        await _async_request(reader, writer, service)
+    except asyncio.IncompleteReadError:
+        writer.close()
+        raise AdbError("Connection closed by adb server")
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def shell_async(serial, cmd, host=ADB_HOST, port=ADB_PORT):
+    """Async counterpart of AdbClient.shell()."""
+    reader, writer = await open_service_async(serial, f"shell:{cmd}", host, port)
+    try:
+        out = await reader.read()
+    finally:
+        writer.close()
+    return out.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the shared AdbClient used by all scripts."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = AdbClient()
+        return _default_client
+
+
+if __name__ == "__main__":
+    import sys
+    client = get_client()
+    if len(sys.argv) > 2 and sys.argv[1] == "shell":
+        print(client.shell(None, " ".join(sys.argv[2:])), end="")
+    else:
+        for serial, state in client.devices():
+            print(f"{serial}\t{state}")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""APK install step shared by the build scripts: skip it when nothing changed.
+
+A local ledger remembers the MD5 of the last APK installed per device and
+package. When the freshly built APK has the same hash, the device is asked
+for the installed copy (`pm path`) and its checksum (`md5sum`), and the
+install is skipped if they match. That is the common case when Gradle was
+up-to-date. On API 24+ changed APKs are streamed straight into
+`cmd package install -S`, so they are not first pushed to /data/local/tmp.
+Older releases (Pepper is API 23) only install from a path, so the APK is
+pushed over the sync protocol and installed with `pm install -r`.
+
+Usage: apk_install.py <serial> <apk> [--package PKG] [--force]
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+from adb_client import AdbError, get_client, quote
+from build_cache import load_entries, save_entries
+
+# Configuration
+LEDGER_NAME = "install_ledger.json"
+LEDGER_VERSION = 1
+INSTALL_TIMEOUT = 120
+CHUNK_SIZE = 256 * 1024
+
+
+def file_md5(path):
+    # MD5 because that is what toybox md5sum on the device can compare against
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InstallLedger:
+    """{serial: {package: md5 of the last APK installed}} kept in the build cache.
+    Without a ledger every install is simply verified on the device."""
+
+    def __init__(self):
+        self.data = load_entries(LEDGER_NAME, LEDGER_VERSION)
+
+    def get(self, serial, package):
+        return self.data.get(serial, {}).get(package)
+
+    def put(self, serial, package, md5):
+        self.data.setdefault(serial, {})[package] = md5
+        save_entries(LEDGER_NAME, LEDGER_VERSION, self.data)
+
+
+def installed_apk(client, serial, package):
+    """(path, md5) of the installed base APK, or (None, None) if not installed."""
+    session = client.shell_session(serial)
+    _, out = session.run(f"pm path {quote(package)}", timeout=30)
+    paths = [line[len("package:"):].strip() for line in out.splitlines() if line.startswith("package:")]
+    if not paths:
+        return None, None
+    # Split APK installs list base.apk first
+    path = paths[0]
+    rc, out = session.run(f"md5sum {quote(path)}", timeout=60)
+    fields = out.split()
+    if rc != 0 or not fields:
+        return path, None
+    return path, fields[0].lower()
+
+
+def sdk_level(client, serial):
+    _, out = client.shell_session(serial).run("getprop ro.build.version.sdk")
+    try:
+        return int(out.strip())
+    except ValueError:
+        return 0
+
+
+def stream_install(client, serial, apk_path, sdk=None):
+    """Installs (replacing) apk_path: streamed on API 24+, pushed then installed before."""
+    size = os.path.getsize(apk_path)
+    sdk = sdk_level(client, serial) if sdk is None else sdk
+    if sdk >= 24:
+        # Reading the APK from stdin (-S) only exists in `cmd package`; `pm install` on M and
+        # older takes a path and rejects -S
+        conn = client.open_exec(serial, f"cmd package install -r -S {size}", timeout=INSTALL_TIMEOUT)
+        with conn, open(apk_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                conn.sendall(chunk)
+            out = conn.read_all().decode("utf-8", errors="replace")
+    else:
+        remote = f"/data/local/tmp/{os.path.basename(apk_path)}"
+        with client.sync(serial) as sync, open(apk_path, "rb") as f:
+            sync.push(f, remote)
+        try:
+            out = client.shell(serial, f"pm install -r {quote(remote)}", timeout=INSTALL_TIMEOUT)
+        finally:
+            client.shell(serial, f"rm -f {quote(remote)}")
+    if "Success" not in out:
+        raise AdbError(f"Install failed: {out.strip() or 'no output'}")
+
+
+def install_apk(serial, apk_path, package=None, force=False, client=None, md5=None):
+    """Installs apk_path unless the same bytes are already installed.
+
+    Returns "skipped" or "installed"; raises AdbError if the install fails.
+    Without a package name the skip check is not possible and it always installs.
+    """
+    client = client or get_client()
+    md5 = md5 or file_md5(apk_path)
+    ledger = InstallLedger()
+    last_md5 = ledger.get(serial, package) if package else None
+
+    # A different hash in the ledger means changed bytes: no need to ask the device.
+    # A matching one is still verified, the app may have been reinstalled or removed since.
+    if package and not force and last_md5 in (None, md5):
+        _, device_md5 = installed_apk(client, serial, package)
+        if device_md5 == md5:
+            if last_md5 is None:
+                ledger.put(serial, package, md5)
+            return "skipped"
+
+    stream_install(client, serial, apk_path)
+    if package:
+        ledger.put(serial, package, md5)
+    return "installed"
+
+
+def start_activity(serial, component, client=None):
+    """`am start -S` (stop first, like install -r did) for "package/activity"."""
+    out = (client or get_client()).shell(serial, f"am start -S -n {quote(component)}", timeout=30)
+    if "Error:" in out:
+        raise AdbError(f"Launch failed: {out.strip()}")
+
+
+def force_stop(serial, package, client=None):
+    (client or get_client()).shell(serial, f"am force-stop {quote(package)}", timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install an APK unless it is already installed")
+    parser.add_argument('serial', help='Device serial')
+    parser.add_argument('apk', help='APK to install')
+    parser.add_argument('--package', help='Package name (enables the skip check)')
+    parser.add_argument('--force', action='store_true', help='Install even if unchanged')
+    args = parser.parse_args()
+    try:
+        result = install_apk(args.serial, args.apk, args.package, args.force)
+    except (AdbError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print("APK unchanged, install skipped." if result == "skipped" else "Installed.")
+
+
+if __name__ == "__main__":
+    main()
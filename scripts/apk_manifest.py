@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Reads package, version, launcher activity and permissions from an APK.
+
+Only AndroidManifest.xml is decompressed from the zip, and its binary XML
+(AXML) chunks are decoded directly: string pool, resource map and element
+start/end events. This replaces `aapt dump badging`, which needed a
+build-tools install and scanned the whole APK. Results are cached by the APK's
+MD5, so an unchanged APK is not even opened again.
+
+Usage: apk_manifest.py <apk>
+"""
+import json
+import struct
+import sys
+import zipfile
+
+from apk_install import file_md5
+from build_cache import load_entries, save_entries
+
+# Configuration
+CACHE_NAME = "apk_manifest.json"
+CACHE_MAX_ENTRIES = 64
+# Bump when parse_manifest()'s output changes, so old cache entries are ignored
+MANIFEST_VERSION = 1
+
+# Chunk types (frameworks/base/libs/androidfw/include/androidfw/ResourceTypes.h)
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+UTF8_FLAG = 1 << 8
+NO_ENTRY = 0xFFFFFFFF
+
+# Typed value data types
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+TYPE_INT_BOOLEAN = 0x12
+
+# android:* attribute resource ids, used when the attribute names were stripped
+ATTR_IDS = {0x01010003: "name", 0x0101021b: "versionCode", 0x0101021c: "versionName", 0x0101000e: "enabled"}
+
+MAIN_ACTION = "android.intent.action.MAIN"
+LAUNCHER_CATEGORY = "android.intent.category.LAUNCHER"
+
+
+class ManifestError(Exception):
+    """Raised when the APK has no readable binary manifest."""
+
+
+def _read_string_pool(data, offset):
+    _, header_size, _, count, _, flags, strings_start = struct.unpack_from("<HHIIIII", data, offset)
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    base = offset + strings_start
+    utf8 = flags & UTF8_FLAG
+    strings = []
+    for string_offset in offsets:
+        pos = base + string_offset
+        if utf8:
+            # UTF-16 length then UTF-8 byte length, each 1 or 2 bytes (high bit = 2 bytes)
+            pos += 2 if data[pos] & 0x80 else 1
+            length = data[pos]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | data[pos + 1]
+                pos += 2
+            else:
+                pos += 1
+            strings.append(data[pos:pos + length].decode("utf-8", errors="replace"))
+        else:
+            length = struct.unpack_from("<H", data, pos)[0]
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", data, pos + 2)[0]
+                pos += 4
+            else:
+                pos += 2
+            strings.append(data[pos:pos + length * 2].decode("utf-16-le", errors="replace"))
+    return strings
+
+
+def iter_elements(data):
+    """Yields ("start", tag, {attr: value}) and ("end", tag, None) from AXML bytes."""
+    if len(data) < 8 or struct.unpack_from("<H", data, 0)[0] != RES_XML_TYPE:
+        raise ManifestError("AndroidManifest.xml is not binary XML")
+    strings = []
+    resource_ids = []
+    offset = struct.unpack_from("<H", data, 2)[0]
+    while offset + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from("<HHI", data, offset)
+        if chunk_size < 8:
+            raise ManifestError("Corrupt chunk in AndroidManifest.xml")
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _read_string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            count = (chunk_size - header_size) // 4
+            resource_ids = struct.unpack_from(f"<{count}I", data, offset + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            ext = offset + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from("<IIHHH", data, ext)
+            attrs = {}
+            for i in range(attr_count):
+                pos = ext + attr_start + i * attr_size
+                _, attr_name, raw, _, _, value_type, value = struct.unpack_from("<IIIHBBI", data, pos)
+                key = strings[attr_name] if attr_name < len(strings) else ""
+                if not key and attr_name < len(resource_ids):
+                    key = ATTR_IDS.get(resource_ids[attr_name], "")
+                if raw != NO_ENTRY:
+                    attrs[key] = strings[raw]
+                elif value_type == TYPE_STRING:
+                    attrs[key] = strings[value]
+                elif value_type in (TYPE_INT_DEC, TYPE_INT_HEX):
+                    attrs[key] = value
+                elif value_type == TYPE_INT_BOOLEAN:
+                    attrs[key] = value != 0
+                elif value_type == TYPE_REFERENCE:
+                    attrs[key] = f"@0x{value:08x}"
+                else:
+                    attrs[key] = value
+            yield "start", strings[name], attrs
+        elif chunk_type == RES_XML_END_ELEMENT_TYPE:
+            name = struct.unpack_from("<I", data, offset + header_size + 4)[0]
+            yield "end", strings[name], None
+        offset += chunk_size
+
+
+def _class_name(package, name):
+    # Same expansion as the package manager: ".Foo" and "Foo" are relative to the package
+    if name.startswith("."):
+        return package + name
+    return name if "." in name else f"{package}.{name}"
+
+
+def parse_manifest(data):
+    """Decodes AXML bytes into {package, version_code, version_name, launcher_activity, permissions}."""
+    info = {"package": None, "version_code": None, "version_name": None,
+            "launcher_activity": None, "permissions": []}
+    activity = None  # Enabled activity (or alias) we are inside of
+    actions, categories = set(), set()
+    for event, tag, attrs in iter_elements(data):
+        if event == "start":
+            if tag == "manifest":
+                info["package"] = attrs.get("package")
+                info["version_code"] = attrs.get("versionCode")
+                info["version_name"] = attrs.get("versionName")
+            elif tag in ("uses-permission", "uses-permission-sdk-23", "uses-permission-sdk-m"):
+                if attrs.get("name") and attrs["name"] not in info["permissions"]:
+                    info["permissions"].append(attrs["name"])
+            elif tag in ("activity", "activity-alias"):
+                activity = attrs.get("name") if attrs.get("enabled", True) is not False else None
+            elif tag == "intent-filter":
+                actions, categories = set(), set()
+            elif tag == "action":
+                actions.add(attrs.get("name"))
+            elif tag == "category":
+                categories.add(attrs.get("name"))
+        elif tag in ("activity", "activity-alias"):
+            activity = None
+        elif tag == "intent-filter":
+            if activity and info["launcher_activity"] is None \
+                    and MAIN_ACTION in actions and LAUNCHER_CATEGORY in categories:
+                info["launcher_activity"] = activity
+    if info["package"] and info["launcher_activity"]:
+        info["launcher_activity"] = _class_name(info["package"], info["launcher_activity"])
+    return info
+
+
+def read_manifest(apk_path, md5=None):
+    """parse_manifest() of the APK's manifest, cached by APK MD5 (pass it if already known)."""
+    md5 = md5 or file_md5(apk_path)
+    cache = load_entries(CACHE_NAME, MANIFEST_VERSION)
+    if md5 in cache:
+        return cache[md5]
+    try:
+        with zipfile.ZipFile(apk_path) as apk:
+            data = apk.read("AndroidManifest.xml")
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ManifestError(f"{apk_path}: {e}")
+    try:
+        info = parse_manifest(data)
+    except (struct.error, IndexError) as e:
+        raise ManifestError(f"{apk_path}: corrupt AndroidManifest.xml ({e})")
+    cache[md5] = info
+    save_entries(CACHE_NAME, MANIFEST_VERSION, cache, CACHE_MAX_ENTRIES)
+    return info
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <apk>")
+        sys.exit(1)
+    try:
+        print(json.dumps(read_manifest(sys.argv[1]), indent=2))
+    except (ManifestError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Small JSON caches under ~/.cache/pepper_build shared by the build scripts.
+
+Each file holds {"version": N, "entries": {...}}. A file written with another
+version (e.g. before a parser changed its output) reads as empty, and writes
+replace the file atomically, so concurrent launches never see half a file.
+"""
+import json
+import os
+import tempfile
+
+# Configuration
+CACHE_DIR = os.path.expanduser("~/.cache/pepper_build")
+
+
+def load_entries(name, version):
+    """Entries of cache file `name`; empty if missing, unreadable or of another version."""
+    try:
+        with open(os.path.join(CACHE_DIR, name), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != version:
+        return {}
+    return data.get("entries", {})
+
+
+def save_entries(name, version, entries, max_entries=None):
+    """Writes entries, keeping only the last max_entries inserted (LRU when callers re-insert on use)."""
+    if max_entries is not None:
+        for key in list(entries)[:max(len(entries) - max_entries, 0)]:
+            del entries[key]
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=CACHE_DIR, delete=False) as tf:
+            json.dump({"version": version, "entries": entries}, tf)
+            temp_name = tf.name
+        os.replace(temp_name, os.path.join(CACHE_DIR, name))
+    except OSError:
+        pass  # Losing a cache write only costs the work it would have saved
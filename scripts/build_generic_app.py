@@ -5,10 +5,11 @@ import re
 import subprocess
 import glob
 
-# Configuration
-SDK_DIR = "/home/linda/Android/Sdk"
-BUILD_TOOLS_DIR = glob.glob(os.path.join(SDK_DIR, "build-tools", "*"))[-1] # Use latest
-AAPT = os.path.join(BUILD_TOOLS_DIR, "aapt")
+from adb_client import AdbError
+from apk_install import file_md5, force_stop, install_apk, start_activity
+from apk_manifest import read_manifest
+from device_registry import get_registry
+from gradle_parser import find_gradle_file, parse_gradle
 
 def run_zenity(args):
     try:
@@ -17,81 +18,14 @@ def run_zenity(args):
     except subprocess.CalledProcessError:
         return None
 
-def parse_gradle(gradle_path):
-    with open(gradle_path, 'r') as f:
-        content = f.read()
-    
-    # Extract dimensions
-    dims_match = re.search(r'flavorDimensions\s+(.*)', content)
-    dimensions = []
-    if dims_match:
-        # Clean up string: "mode", "device" -> ['mode', 'device']
-        raw = dims_match.group(1)
-        # Remove comments
-        raw = re.sub(r'//.*', '', raw)
-        dimensions = [d.strip().strip('"\'') for d in raw.split(',')]
-
-    # Extract flavors
-    flavors = {} # {dimension: [flavor_names]}
-    
-    # Find productFlavors block start
-    start_match = re.search(r'productFlavors\s*\{', content)
-    if start_match:
-        start_idx = start_match.end()
-        # Brace counting to find the end of the block
-        brace_count = 1
-        i = start_idx
-        while i < len(content) and brace_count > 0:
-            if content[i] == '{':
-                brace_count += 1
-            elif content[i] == '}':
-                brace_count -= 1
-            i += 1
-        
-        block_content = content[start_idx:i-1]
-        
-        # Find flavor definitions: name { ... }
-        # We look for words followed by {
-        # This regex matches "name {"
-        flavor_defs = re.finditer(r'(\w+)\s*\{', block_content)
-        
-        for match in flavor_defs:
-            name = match.group(1)
-            # Find the body of this flavor to extract dimension
-            f_start = match.end()
-            f_brace = 1
-            j = f_start
-            while j < len(block_content) and f_brace > 0:
-                if block_content[j] == '{':
-                    f_brace += 1
-                elif block_content[j] == '}':
-                    f_brace -= 1
-                j += 1
-            
-            f_body = block_content[f_start:j-1]
-            
-            dim_match = re.search(r'dimension\s+["\'](\w+)["\']', f_body)
-            if dim_match:
-                dim = dim_match.group(1)
-                if dim not in flavors:
-                    flavors[dim] = []
-                flavors[dim].append(name)
-    
-    return dimensions, flavors
-
 def select_device():
     try:
-        out = subprocess.check_output(["adb", "devices"], text=True)
-        lines = out.strip().split('\n')[1:] # Skip header
-        devices = [line.split()[0] for line in lines if "device" in line and not "List" in line]
+        # Already deduplicated (emulator-5554 hides localhost:5555, they are the same)
+        devices = get_registry().devices()
         
         if not devices:
             print("Error: No devices connected!")
             sys.exit(1)
-        
-        # Deduplicate: If emulator-5554 is present, ignore localhost:5555 (they are likely the same)
-        if "emulator-5554" in devices and "localhost:5555" in devices:
-            devices.remove("localhost:5555")
             
         if len(devices) == 1:
             return devices[0]
@@ -118,16 +52,18 @@ def main():
 
     project_root = args.project_root
     app_dir = os.path.join(project_root, "app")
-    gradle_file = os.path.join(app_dir, "build.gradle")
+    gradle_file = find_gradle_file(app_dir)
     launch_json = os.path.join(project_root, ".vscode", "launch.json")
 
-    if not os.path.exists(gradle_file):
-        print("No build.gradle found.")
+    if not gradle_file:
+        print("No build.gradle(.kts) found.")
         sys.exit(1)
 
-    dimensions, flavors = parse_gradle(gradle_file)
+    gradle = parse_gradle(gradle_file)
+    dimensions, flavors = gradle["dimensions"], gradle["flavors"]
     
     selected_flavors = []
+    caps_flavors = ""
     
     if not dimensions:
         print("No flavors found. Building default debug.")
@@ -170,7 +106,8 @@ def main():
     if args.build_type:
         build_type = args.build_type
     else:
-        build_type = run_zenity(["--list", "--title=Select Build Type", "--text=Choose Build Type", "--column=Type", "Debug", "Release"])
+        build_types = [bt[0].upper() + bt[1:] for bt in gradle["build_types"]]
+        build_type = run_zenity(["--list", "--title=Select Build Type", "--text=Choose Build Type", "--column=Type"] + build_types)
         if not build_type:
             print("Cancelled.")
             sys.exit(1)
@@ -196,7 +133,7 @@ def main():
 
     # Find the APK
     # Search for *-debug.apk or *-release.apk based on build type
-    suffix = "debug.apk" if is_debug else "release.apk"
+    suffix = f"{build_type[0].lower() + build_type[1:]}.apk"
     # Also handle unsigned release APKs
     apk_pattern = os.path.join(app_dir, "build", "outputs", "apk", "**", f"*-{suffix}")
     if not is_debug:
@@ -220,12 +157,12 @@ def main():
     os.makedirs(os.path.dirname(dest_apk), exist_ok=True)
     os.system(f"cp '{latest_apk}' '{dest_apk}'")
     
-    # Extract Package Name using AAPT
+    # Package name and launcher activity straight from the APK's manifest
     try:
-        aapt_out = subprocess.check_output([AAPT, "dump", "badging", dest_apk], text=True)
-        pkg_match = re.search(r"package: name='([^']+)'", aapt_out)
-        if pkg_match:
-            pkg_name = pkg_match.group(1)
+        md5 = file_md5(dest_apk)
+        manifest = read_manifest(dest_apk, md5)
+        pkg_name = manifest["package"]
+        if pkg_name:
             print(f"Detected Package: {pkg_name}")
             
             # Select Device
@@ -236,13 +173,11 @@ def main():
             print("==========================================")
             print(f"Installing APK to {device_serial}...")
             print("==========================================")
-            subprocess.run(["adb", "-s", device_serial, "install", "-r", dest_apk], check=True)
+            if install_apk(device_serial, dest_apk, pkg_name, md5=md5) == "skipped":
+                print("APK unchanged on device, install skipped.")
             
             # Detect Launchable Activity
-            act_match = re.search(r"launchable-activity: name='([^']+)'", aapt_out)
-            launch_act = f"{pkg_name}.MainActivity" # Default
-            if act_match:
-                launch_act = act_match.group(1)
+            launch_act = manifest["launcher_activity"] or f"{pkg_name}.MainActivity" # Default
             
             print("==========================================")
             print(f"Launching {launch_act} on {device_serial}...")
@@ -250,13 +185,13 @@ def main():
             
             if is_debug:
                 # Launch without -D (don't wait for debugger)
-                subprocess.run(["adb", "-s", device_serial, "shell", "am", "start", "-n", f"{pkg_name}/{launch_act}"], check=True)
+                start_activity(device_serial, f"{pkg_name}/{launch_act}")
                 print("==========================================")
                 print("App Launched! (Debug Mode - Attempting to Attach...)")
                 print("==========================================")
             else:
                 # Launch immediately
-                subprocess.run(["adb", "-s", device_serial, "shell", "am", "start", "-n", f"{pkg_name}/{launch_act}"], check=True)
+                start_activity(device_serial, f"{pkg_name}/{launch_act}")
                 print("==========================================")
                 print("App Launched! (Release Mode - Debugger will NOT attach)")
                 print("==========================================")
@@ -284,7 +219,10 @@ def main():
                 subprocess.run(["cat"], check=False) # Dummy wait
             except KeyboardInterrupt:
                 print("\nStopping App...")
-                subprocess.run(["adb", "-s", device_serial, "shell", "am", "force-stop", pkg_name], check=False)
+                try:
+                    force_stop(device_serial, pkg_name)
+                except (AdbError, OSError) as e:
+                    print(f"Could not stop the app: {e}")
                 print("App Stopped.")
                 sys.exit(0)
 
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Builds a matrix of variants (flavor combinations x build types) in one run.
+
+All assemble tasks go to a single Gradle invocation with --continue, so the
+project is configured once and one failing variant does not stop the others;
+--workers bounds how many tasks Gradle runs at the same time. Separate
+concurrent gradlew processes are not used: they would contend for the same
+project locks and build directory.
+
+The plain console output is followed to attribute each task to its variant,
+and a summary with outcome, duration and APK size per variant is printed at
+the end. Durations are the wall-clock span between the variant's first and
+last task, so with several workers they overlap.
+
+Examples:
+    build_matrix.py ~/AndroidStudioProjects/Raven
+    build_matrix.py ~/AndroidStudioProjects/Raven --flavor mode=prod --build-type debug --build-type release
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from gradle_parser import assemble_task, find_gradle_file, flavor_name, parse_gradle
+
+# `> Task :app:packageProdPepperDebug UP-TO-DATE`
+TASK_LINE = re.compile(r'^> Task (\S*:)?(\w+)(?: (\S[\w -]*))?$')
+# Task states that mean no work was done
+UP_TO_DATE = {"UP-TO-DATE", "FROM-CACHE", "NO-SOURCE", "SKIPPED"}
+
+
+class Variant:
+    def __init__(self, dimensions, selected, build_type, app_dir):
+        self.selected = selected
+        self.build_type = build_type
+        self.flavor = flavor_name(dimensions, selected)
+        self.task = assemble_task(dimensions, selected, build_type)
+        self.name = self.task[len("assemble"):]
+        self.apk_dir = os.path.join(app_dir, "build", "outputs", "apk", self.flavor, build_type) \
+            if self.flavor else os.path.join(app_dir, "build", "outputs", "apk", build_type)
+        self.first = None  # Monotonic time of the line before its first task
+        self.last = None
+        self.tasks = 0
+        self.up_to_date = 0
+        self.failed = False
+        self.assembled = False
+
+    def apk(self):
+        apks = [a for a in glob.glob(os.path.join(self.apk_dir, "*.apk")) if "selected-" not in os.path.basename(a)]
+        return max(apks, key=os.path.getmtime) if apks else None
+
+    def outcome(self):
+        if self.failed:
+            return "failed"
+        if not self.assembled:
+            return "not run"
+        return "up-to-date" if self.up_to_date == self.tasks else "built"
+
+
+def matrix(gradle, app_dir, flavor_filter=None, build_types=None):
+    """Variants for every combination of the (filtered) flavors and build types."""
+    dimensions = gradle["dimensions"]
+    flavor_filter = flavor_filter or {}
+    options = []
+    for dim in dimensions:
+        opts = gradle["flavors"].get(dim, [])
+        wanted = flavor_filter.get(dim)
+        options.append([o for o in opts if o in wanted] if wanted else opts)
+    variants = []
+    for build_type in build_types or gradle["build_types"]:
+        for combo in itertools.product(*options):
+            variants.append(Variant(dimensions, dict(zip(dimensions, combo)), build_type, app_dir))
+    return variants
+
+
+def _owner(task, variants):
+    """The variant a task belongs to: the longest variant name it contains."""
+    best = None
+    for variant in variants:
+        if variant.name in task and (best is None or len(variant.name) > len(best.name)):
+            best = variant
+    return best
+
+
+def run_matrix(project_root, variants, workers=None):
+    """Runs all variants in one Gradle invocation and returns its exit code."""
+    cmd = [os.path.join(project_root, "gradlew"), "--continue", "--console=plain"]
+    if workers:
+        cmd.append(f"--max-workers={workers}")
+    cmd += [variant.task for variant in variants]
+    print(f"Running: {' '.join(cmd)}")
+
+    proc = subprocess.Popen(cmd, cwd=project_root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, bufsize=1)
+    previous = time.monotonic()
+    for line in proc.stdout:
+        sys.stdout.write(line)
+        match = TASK_LINE.match(line.rstrip())
+        if not match:
+            continue
+        now = time.monotonic()
+        task, state = match.group(2), match.group(3)
+        variant = _owner(task, variants)
+        if variant:
+            # Plain console prints a task when it completes, so it started after the previous one
+            if variant.first is None:
+                variant.first = previous
+            variant.last = now
+            variant.tasks += 1
+            if state in UP_TO_DATE:
+                variant.up_to_date += 1
+            if state == "FAILED":
+                variant.failed = True
+            if task == variant.task:
+                variant.assembled = True
+        previous = now
+    return proc.wait()
+
+
+def format_size(size):
+    return "-" if size is None else f"{size / (1024 * 1024):.1f} MB"
+
+
+def summary(variants):
+    rows = []
+    for variant in variants:
+        apk = variant.apk() if variant.outcome() in ("built", "up-to-date") else None
+        rows.append({
+            "variant": variant.name,
+            "task": variant.task,
+            "outcome": variant.outcome(),
+            "duration": round(variant.last - variant.first, 1) if variant.first is not None else None,
+            "apk": apk,
+            "apk_size": os.path.getsize(apk) if apk else None,
+        })
+    return rows
+
+
+def print_summary(rows):
+    width = max([len(row["variant"]) for row in rows] + [7])
+    print("\n" + "=" * 42)
+    print(f"{'Variant':<{width}}  {'Outcome':<10}  {'Time':>7}  {'APK':>9}")
+    for row in rows:
+        duration = "-" if row["duration"] is None else f"{row['duration']:.1f}s"
+        print(f"{row['variant']:<{width}}  {row['outcome']:<10}  {duration:>7}  {format_size(row['apk_size']):>9}")
+    print("=" * 42)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build every flavor/build type combination in one Gradle run")
+    parser.add_argument('project_root', help='Root directory of the project')
+    parser.add_argument('--flavor', action='append', default=[],
+                        help='Restrict a dimension, e.g. mode=prod (repeat for several values)')
+    parser.add_argument('--build-type', action='append', help='Build type to include (repeatable, default all)')
+    parser.add_argument('--workers', type=int, help='Maximum tasks Gradle runs in parallel')
+    parser.add_argument('--json', help='Also write the summary to this JSON file')
+    args = parser.parse_args()
+
+    app_dir = os.path.join(args.project_root, "app")
+    gradle_file = find_gradle_file(app_dir)
+    if not gradle_file:
+        print("No build.gradle(.kts) found.")
+        sys.exit(1)
+    gradle = parse_gradle(gradle_file)
+
+    flavor_filter = {}
+    for f in args.flavor:
+        if '=' not in f:
+            print(f"Ignoring --flavor {f}: expected dimension=flavor")
+            continue
+        dim, value = f.split('=', 1)
+        flavor_filter.setdefault(dim, []).append(value)
+    build_types = [bt[0].lower() + bt[1:] for bt in args.build_type] if args.build_type else None
+
+    variants = matrix(gradle, app_dir, flavor_filter, build_types)
+    if not variants:
+        print("No variants match the given filters.")
+        sys.exit(1)
+    print(f"Building {len(variants)} variants: {', '.join(v.name for v in variants)}")
+
+    returncode = run_matrix(args.project_root, variants, args.workers)
+    rows = summary(variants)
+    print_summary(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+    sys.exit(returncode)
+
+
+if __name__ == "__main__":
+    main()
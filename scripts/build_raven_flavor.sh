@@ -1,5 +1,6 @@
 #!/bin/bash
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_DIR="/home/linda/AndroidStudioProjects/Raven"
 LAUNCH_JSON="$PROJECT_DIR/.vscode/launch.json"
 BASE_PACKAGE="it.diunito.raven"
@@ -134,7 +135,8 @@ echo "Target Device: $DEVICE_SERIAL"
 echo "=========================================="
 echo "Installing APK to $DEVICE_SERIAL..."
 echo "=========================================="
-adb -s "$DEVICE_SERIAL" install -r "$APK_PATH"
+# Skipped when the same APK is already installed (see apk_install.py)
+python3 "$SCRIPT_DIR/apk_install.py" "$DEVICE_SERIAL" "$APK_PATH" --package "$PACKAGE" || exit 1
 
 echo "=========================================="
 echo "Launching App on $DEVICE_SERIAL..."
@@ -142,13 +144,13 @@ echo "=========================================="
 
 if [ "$IS_DEBUG" = "true" ]; then
     # Launch without -D (don't wait for debugger) to avoid hanging if attach fails
-    adb -s "$DEVICE_SERIAL" shell am start -n "$PACKAGE/$BASE_PACKAGE.MainActivity"
+    adb -s "$DEVICE_SERIAL" shell am start -S -n "$PACKAGE/$BASE_PACKAGE.MainActivity"
     echo "=========================================="
     echo "App Launched! (Debug Mode - Attempting to Attach...)"
     echo "=========================================="
 else
     # Launch immediately (Release mode)
-    adb -s "$DEVICE_SERIAL" shell am start -n "$PACKAGE/$BASE_PACKAGE.MainActivity"
+    adb -s "$DEVICE_SERIAL" shell am start -S -n "$PACKAGE/$BASE_PACKAGE.MainActivity"
     echo "=========================================="
     echo "App Launched! (Release Mode - Debugger will NOT attach)"
     echo "=========================================="
@@ -4,6 +4,140 @@ from tkinter import ttk, messagebox, filedialog
 import subprocess
 import os
 import threading
+import time
+
+from adb_client import AdbError, get_client, quote
+from device_registry import get_registry
+from explorer_cache import DiskUsageCache, FileCache, ListingCache
+from explorer_model import STAT_FORMAT, format_size, parse_stat_line, read_dir, row_text, view
+from explorer_transfer import TarDownload, Transfer, plan_download, plan_upload
+
+# Subdirectories of the shown folder listed ahead of a double-click
+PREFETCH_LIMIT = 16
+# Rows inserted per Tk event-loop slice, so big folders never freeze the UI
+INSERT_CHUNK = 300
+# Above this many rows only the visible window exists in the Treeview
+VIRTUAL_THRESHOLD = 2000
+ROW_HEIGHT = 20
+# Tk event.state bits of a modifier click (extend the selection instead of replacing it)
+SHIFT_MASK = 0x1
+CONTROL_MASK = 0x4
+# A search stops after this many matches (refine the query for more)
+SEARCH_LIMIT = 5000
+# Matches passed to one stat call, so results stream instead of waiting for the whole walk
+SEARCH_STAT_BATCH = 64
+# Watch mode polling interval (seconds): back to the minimum after a change
+WATCH_MIN = 1.0
+WATCH_MAX = 15.0
+
+
+class StreamJob:
+    """Cancellation handle for one streaming device command (search, sizes)."""
+
+    def __init__(self):
+        self.cancelled = False
+        self.conn = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                conn.close()
+            else:
+                self.conn = conn
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.conn is not None:
+                self.conn.close()  # Wakes the blocked reader
+
+
+class TransferWindow(tk.Toplevel):
+    """Per-file progress of one Transfer, polled from the Tk thread."""
+
+    def __init__(self, master, transfer, title, on_done=None):
+        super().__init__(master)
+        self.title(title)
+        self.geometry("700x400")
+        self.transfer = transfer
+        self.on_done = on_done
+
+        self.status_label = ttk.Label(self, text="Starting...")
+        self.status_label.pack(fill=tk.X, padx=5, pady=5)
+        self.tree = ttk.Treeview(self, columns=("Status", "Progress"))
+        self.tree.heading("#0", text="File", anchor=tk.W)
+        self.tree.heading("Status", text="Status", anchor=tk.W)
+        self.tree.heading("Progress", text="Progress", anchor=tk.W)
+        self.tree.column("#0", width=450)
+        self.tree.column("Status", width=150)
+        self.tree.column("Progress", width=80)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5)
+        self.cancel_button = ttk.Button(self, text="Cancel", command=transfer.cancel)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5, pady=5)
+
+        self.items = [self.tree.insert("", "end", text=job.src, values=(job.status, "")) for job in transfer.jobs]
+        self._shown = [None] * len(self.items)
+        self._poll()
+
+    def _poll(self):
+        done_bytes = total_bytes = 0
+        for i, job in enumerate(self.transfer.jobs):
+            percent = job.done * 100 // job.size if job.size else 100
+            values = (f"{job.status}: {job.error}" if job.error else job.status, f"{percent}%")
+            # Only touch rows that changed
+            if values != self._shown[i]:
+                self._shown[i] = values
+                self.tree.item(self.items[i], values=values)
+            done_bytes += job.done
+            total_bytes += job.size
+
+        if not self.transfer.finished:
+            self.status_label.config(text=f"{done_bytes // 1024} / {total_bytes // 1024} KB")
+            self.after(250, self._poll)
+            return
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(self.transfer.summary().items()))
+        self.status_label.config(text=f"Finished: {summary or 'nothing to do'}")
+        self.cancel_button.config(text="Close", command=self.destroy)
+        if self.on_done:
+            self.on_done()
+
+
+class ArchiveWindow(tk.Toplevel):
+    """Progress of one TarDownload (total size is unknown while streaming)."""
+
+    def __init__(self, master, download, title):
+        super().__init__(master)
+        self.title(title)
+        self.geometry("600x120")
+        self.download = download
+        self.status_label = ttk.Label(self, text="Starting...")
+        self.status_label.pack(fill=tk.X, padx=10, pady=10)
+        self.current_label = ttk.Label(self, text="")
+        self.current_label.pack(fill=tk.X, padx=10)
+        self.cancel_button = ttk.Button(self, text="Cancel", command=download.cancel)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5, pady=5)
+        self._poll()
+
+    def _poll(self):
+        download = self.download
+        elapsed = max(time.monotonic() - download.started, 1e-6)
+        mb = download.bytes / (1024 * 1024)
+        status = f"{download.files} files, {mb:.1f} MB received ({mb / elapsed:.1f} MB/s)"
+        if not download.finished:
+            self.status_label.config(text=status)
+            self.current_label.config(text=download.current or "")
+            self.after(250, self._poll)
+            return
+        if download.error:
+            status = f"Failed: {download.error} ({status})"
+        elif download.cancelled:
+            status = f"Cancelled ({status})"
+        else:
+            status = f"Finished: {status}"
+        self.status_label.config(text=status)
+        self.current_label.config(text="")
+        self.cancel_button.config(text="Close", command=self.destroy)
 
 
 class DeviceExplorer(tk.Tk):
@@ -14,6 +148,31 @@ class DeviceExplorer(tk.Tk):
 
         self.current_path = "/sdcard"
         self.history = []
+        self.listings = ListingCache()
+        self.files = FileCache()
+        self.dir_sizes = DiskUsageCache()
+        self._sizes_job = None
+        self._prefetch_gen = 0
+        # In-memory model of the shown folder; sort/filter never re-list it
+        self.entries = []
+        self.view_rows = []
+        self.view_sizes = {}  # Computed recursive sizes of the shown subfolders
+        self._row_items = {}  # name -> Treeview item (chunked mode)
+        self._row_shown = {}  # Treeview item -> (text, values, tags) last written
+        self._rendered_path = None  # Folder the rows belong to; same folder -> diff update
+        self._watch_job = None
+        self._watch_after = None
+        self._watch_interval = WATCH_MIN
+        self._has_inotifywait = {}  # serial -> bool
+        self.sort_key = "name"
+        self.sort_reverse = False
+        self.search_active = False
+        self._search = None
+        self._render_gen = 0
+        self.virtual = False
+        self.virtual_offset = 0
+        self._virtual_window = []
+        self._virtual_selected = set()
         
         # Detect device
         self.device_id = self.get_connected_device()
@@ -38,189 +197,536 @@ class DeviceExplorer(tk.Tk):
         self.search_entry.bind('<Return>', lambda e: self.perform_search())
         
         ttk.Button(top_frame, text="Find", command=self.perform_search).pack(side=tk.LEFT)
+        ttk.Button(top_frame, text="Stop", command=self.cancel_search).pack(side=tk.LEFT)
         ttk.Button(top_frame, text="Clear", command=self.clear_search).pack(side=tk.LEFT)
         
-        ttk.Button(top_frame, text="Refresh", command=self.refresh).pack(side=tk.RIGHT)
+        ttk.Button(top_frame, text="Refresh", command=lambda: self.refresh(use_cache=False)).pack(side=tk.RIGHT)
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(top_frame, text="Watch", variable=self.watch_var,
+                        command=self._restart_watch).pack(side=tk.RIGHT, padx=5)
 
+        # Filters the shown folder in memory
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.apply_view())
+        ttk.Entry(top_frame, textvariable=self.filter_var, width=15).pack(side=tk.RIGHT, padx=5)
+        ttk.Label(top_frame, text="Filter:").pack(side=tk.RIGHT)
 
         # Treeview for files
-        self.tree = ttk.Treeview(self, columns=("Size", "Date"), selectmode="browse")
-        self.tree.heading("#0", text="Name", anchor=tk.W)
-        self.tree.heading("Size", text="Size", anchor=tk.W)
-        self.tree.heading("Date", text="Date", anchor=tk.W)
+        ttk.Style(self).configure("Treeview", rowheight=ROW_HEIGHT)
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.tree = ttk.Treeview(tree_frame, columns=("Size", "Date"), selectmode="extended")
+        self.tree.heading("#0", text="Name", anchor=tk.W, command=lambda: self.sort_by("name"))
+        self.tree.heading("Size", text="Size", anchor=tk.W, command=lambda: self.sort_by("size"))
+        self.tree.heading("Date", text="Date", anchor=tk.W, command=lambda: self.sort_by("date"))
         self.tree.column("#0", width=400)
         self.tree.column("Size", width=100)
         self.tree.column("Date", width=150)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.vsb = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        self.vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._set_virtual(False)
 
         self.tree.bind("<Double-1>", self.on_double_click)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_wheel)
+        self.tree.bind("<Configure>", lambda e: self.virtual and self._fill_virtual())
+        self.tree.bind("<ButtonPress-1>", self._on_click, add="+")
         
         # Bottom Actions
         bottom_frame = ttk.Frame(self)
         bottom_frame.pack(fill=tk.X, padx=5, pady=5)
         
         ttk.Button(bottom_frame, text="Delete Selected", command=self.delete_selected).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(bottom_frame, text="Download Selected...", command=self.download_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom_frame, text="Download as Archive...", command=self.download_archive).pack(side=tk.LEFT, padx=5)
+        self.compress_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(bottom_frame, text="Compress (Wi-Fi)", variable=self.compress_var).pack(side=tk.LEFT)
+        ttk.Button(bottom_frame, text="Upload Files...", command=self.upload_files).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom_frame, text="Upload Folder...", command=self.upload_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom_frame, text="Cache Stats", command=self.show_cache_stats).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(bottom_frame, text="Compute Sizes", command=self.compute_sizes).pack(side=tk.LEFT, padx=5)
 
+        get_registry().add_listener(self._on_device_change)
         self.refresh()
 
     def get_connected_device(self):
+        # Prefer physical device if multiple (usually starts with 192 or is not emulator)
         try:
-            output = subprocess.check_output("adb devices", shell=True, text=True, timeout=5)
-            lines = output.strip().split('\n')[1:] # Skip header
-            devices = [line.split()[0] for line in lines if line.strip() and "device" in line]
-            
-            if not devices:
-                return None
-            
-            # Prefer physical device if multiple (usually starts with 192 or is not emulator)
-            for dev in devices:
-                if not dev.startswith("emulator"):
-                    return dev
-            
-            return devices[0] # Default to first found
+            return get_registry().preferred(prefer_physical=True)
         except:
             return None
 
-    def run_adb(self, cmd, timeout=10):
-        # Inject device ID if we have one and it's not already in the command
-        if self.device_id and "adb " in cmd and "-s " not in cmd:
-            cmd = cmd.replace("adb ", f"adb -s {self.device_id} ")
-            
-        try:
-            return subprocess.check_output(cmd, shell=True, text=True, timeout=timeout)
-        except subprocess.TimeoutExpired:
-            print(f"Command timed out: {cmd}")
-            return None
-        except subprocess.CalledProcessError as e:
-            return None
+    def _on_device_change(self, serial, old_state, new_state):
+        # Called from the tracker thread: hop to the Tk thread
+        if new_state != "device":
+            self.listings.drop_device(serial)
+            self.dir_sizes.drop_device(serial)
+        self.after(0, self._on_connection_change)
+
+    def _on_connection_change(self):
+        if self._update_connection():
+            self.refresh()
+
+    def _update_connection(self):
+        device_id = self.get_connected_device()
+        changed = device_id != self.device_id
+        self.device_id = device_id
+        if self.device_id:
+            self.title(f"Pepper Device Explorer - Connected to {self.device_id}")
+        else:
+            self.title("Pepper Device Explorer - Not Connected")
+        return changed
 
     def perform_search(self):
         query = self.search_var.get().strip()
         if not query:
             return
 
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
+        self.cancel_search()
+        self._clear_view()
+        self._stop_watch()
+        self.search_active = True
         self.path_label.config(text=f"Searching for '{query}' in {self.current_path}...")
-        self.update_idletasks()
-        
-        # Use find command
-        # -L to follow symlinks? Maybe not to avoid loops.
-        # Use find command
-        # -L to follow symlinks? Maybe not to avoid loops.
-        device_flag = f"-s {self.device_id}" if self.device_id else ""
-        cmd = f"adb {device_flag} shell find \"{self.current_path}\" -name \"*{query}*\""
-        output = self.run_adb(cmd)
-        
-        if output:
-            lines = output.split('\n')
-            for line in lines:
-                path = line.strip()
-                if not path: continue
-                
-                # Check if permission denied or other error in output
-                if "Permission denied" in path: continue
-                
-                # Get details for this file to look nice
-                # This might be slow for many results, so maybe just show path
-                # Let's just show the path relative to current_path or full path
-                
-                name = os.path.basename(path)
-                full_path = path
-                
-                # Determine if dir (simple heuristic: find output doesn't tell us easily without ls -ld)
-                # We'll assume file for icon unless we check. 
-                # Let's just show a generic search icon 🔍
-                
-                self.tree.insert("", "end", text=f"🔍 {full_path}", values=("-", "-"), tags=("search_result",))
-        
-        self.path_label.config(text=f"Search results for '{query}'")
+
+        # Results stream in from a background thread; a new render or search drops stale batches
+        job = self._search = StreamJob()
+        threading.Thread(target=self._search_thread, args=(self.current_path, query, self._render_gen, job),
+                         daemon=True).start()
+
+    def cancel_search(self):
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
+
+    def _search_thread(self, path, query, gen, job):
+        # One pass returns type, size and mtime with each match (toybox on API 23 has no -printf).
+        # stat runs on small batches so matches arrive while find is still walking; `-exec {} +`
+        # would hold them until find's argument buffer filled up.
+        # exec: instead of shell: so the stream is not mangled by a pty.
+        cmd = (f"find {quote(path)} -name {quote(f'*{query}*')} -print0 2>/dev/null "
+               f"| xargs -0 -n {SEARCH_STAT_BATCH} stat -c {quote(STAT_FORMAT)} 2>/dev/null")
+        count = 0
+        error = None
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            conn = get_client().open_exec(self.device_id, cmd)
+            job.attach(conn)
+            with conn:
+                for raw in conn.makefile("rb"):
+                    entry = parse_stat_line(raw.decode("utf-8", errors="replace").rstrip("\n"))
+                    if entry is None:
+                        continue
+                    batch.append(entry)
+                    count += 1
+                    if count >= SEARCH_LIMIT:
+                        break
+                    if time.monotonic() - last_flush >= 0.1:
+                        self.after(0, self._add_search_results, gen, batch)
+                        batch = []
+                        last_flush = time.monotonic()
+        except (AdbError, OSError, ValueError) as e:
+            if not job.cancelled:
+                error = str(e)
+        self.after(0, self._add_search_results, gen, batch, (query, count, job.cancelled, error))
+
+    def _add_search_results(self, gen, entries, done=None):
+        if gen != self._render_gen:
+            return  # The view moved on
+        for entry in entries:
+            text, values, tags = row_text(entry)
+            self.tree.insert("", "end", text=text, values=values, tags=("search_result",) + tags)
+        if done is None:
+            return
+        query, count, cancelled, error = done
+        if error:
+            status = f"Search for '{query}' failed after {count} results: {error}"
+        elif cancelled:
+            status = f"Search for '{query}' stopped: {count} results"
+        elif count >= SEARCH_LIMIT:
+            status = f"First {count} results for '{query}' (refine the query for more)"
+        else:
+            status = f"Search results for '{query}' ({count})"
+        self.path_label.config(text=status)
 
     def clear_search(self):
         self.search_var.set("")
         self.refresh()
 
-    def refresh(self):
+    def refresh(self, use_cache=True):
+        # Navigation reuses cached listings; the Refresh button always re-lists
         self.path_label.config(text=f"Loading {self.current_path}...")
         
-        # Update connection status
-        self.device_id = self.get_connected_device()
-        if self.device_id:
-            self.title(f"Pepper Device Explorer - Connected to {self.device_id}")
-        else:
-            self.title("Pepper Device Explorer - Not Connected")
+        # Update connection status (in-memory lookup, no adb round-trip)
+        self._update_connection()
+        self._prefetch_gen += 1
+        self.search_active = False
+        self.cancel_search()
+        self.cancel_sizes()
+        self._restart_watch()
+
+        # A new folder is cleared immediately to show something is happening;
+        # re-listing the same folder keeps the rows and only applies the differences
+        if self.current_path != self._rendered_path:
+            self._clear_view()
+
+        entries = self.listings.get(self.device_id, self.current_path) if use_cache else None
+        if entries is not None:
+            self._show_listing(self.current_path, entries)
+            return
 
-        # Clear current view immediately to show something is happening
-        # Clear current view immediately to show something is happening
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
         # Run in background
-        threading.Thread(target=self._refresh_thread, daemon=True).start()
+        threading.Thread(target=self._refresh_thread, args=(self.current_path,), daemon=True).start()
 
-    def _refresh_thread(self):
-        list_path = self.current_path
-        if not list_path.endswith('/'):
-            list_path += '/'
-            
-        device_flag = f"-s {self.device_id}" if self.device_id else ""
-        cmd = f"adb {device_flag} shell ls -l \"{list_path}\""
-        
-        output = self.run_adb(cmd, timeout=15)
+    def list_dir(self, path):
+        """Listing of path as DirEntry records (None on failure), stored in the listing cache.
+        Runs on background threads, over a pooled sync session."""
+        device_id = self.device_id
+        try:
+            with get_client().sync(device_id) as sync:
+                entries = read_dir(sync, path)
+        except (AdbError, OSError) as e:
+            print(f"Listing {path} failed: {e}")
+            return None
+        self.listings.put(device_id, path, entries)
+        return entries
+
+    def _refresh_thread(self, path):
+        entries = self.list_dir(path)
         
         # Schedule UI update on main thread
-        self.after(0, self._populate_tree, output)
+        self.after(0, self._show_listing, path, entries)
+
+    def _prefetch(self, paths):
+        # One background worker per shown folder; a newer navigation cancels it
+        gen = self._prefetch_gen
+        device_id = self.device_id
 
-    def _populate_tree(self, output):
+        def worker():
+            for path in paths:
+                if gen != self._prefetch_gen or device_id != self.device_id:
+                    return
+                if not self.listings.contains(device_id, path):
+                    self.list_dir(path)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _show_listing(self, path, entries):
+        if path != self.current_path or self.search_active:
+            return  # The user moved on while this was loading
+        if entries is None:
+            self.path_label.config(text=f"{self.current_path} (listing failed)")
+            return
         self.path_label.config(text=self.current_path)
-        
-        if not output:
+        self.entries = entries
+        self.apply_view()
+
+        subdirs = [f"{path.rstrip('/')}/{e.name}" for e in self.view_rows[:PREFETCH_LIMIT] if e.is_dir]
+        if subdirs:
+            self._prefetch(subdirs)
+
+    # --- Watch mode ---
+
+    def _restart_watch(self):
+        self._stop_watch()
+        if not self.watch_var.get() or self.search_active or not self.device_id:
             return
+        self._watch_interval = WATCH_MIN
+        job = self._watch_job = StreamJob()
+        threading.Thread(target=self._watch_thread, args=(self.device_id, self.current_path, job),
+                         daemon=True).start()
 
-        lines = output.split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("total"): continue
-            
-            parts = line.split()
-            if len(parts) < 6: continue
-            
-            # Parse based on Date/Time position
-            # Format usually: perms owner group [size] date time name
-            # We look for the date pattern YYYY-MM-DD
-            
-            date_idx = -1
-            for i, part in enumerate(parts):
-                if len(part) == 10 and part[4] == '-' and part[7] == '-':
-                    date_idx = i
-                    break
-            
-            if date_idx != -1 and date_idx + 2 < len(parts):
-                perms = parts[0]
-                date = parts[date_idx]
-                time = parts[date_idx+1]
-                name = " ".join(parts[date_idx+2:])
-                
-                # Size is usually before date
-                size = "-"
-                if date_idx > 0:
-                    potential_size = parts[date_idx-1]
-                    if potential_size.isdigit():
-                        size = potential_size
-                
-                is_dir = perms.startswith('d')
-                
-                # Icon prefix
-                icon = "📁 " if is_dir else "📄 "
-                
-                # Insert into tree
-                self.tree.insert("", "end", text=f"{icon}{name}", values=(size, f"{date} {time}"), tags=("dir" if is_dir else "file",))
+    def _stop_watch(self):
+        if self._watch_after is not None:
+            self.after_cancel(self._watch_after)
+            self._watch_after = None
+        if self._watch_job is not None:
+            self._watch_job.cancel()
+            self._watch_job = None
+
+    def _watch_thread(self, device_id, path, job):
+        # inotifywait (when the image has it) pushes changes; otherwise poll with an adaptive interval
+        if device_id not in self._has_inotifywait:
+            try:
+                rc, _ = get_client().shell_session(device_id).run("command -v inotifywait")
+            except (AdbError, OSError):
+                rc = None
+            self._has_inotifywait[device_id] = rc == 0
+        if self._has_inotifywait[device_id]:
+            cmd = f"inotifywait -m -q -e create,delete,modify,attrib,moved_to,moved_from {quote(path)}"
+            try:
+                conn = get_client().open_exec(device_id, cmd)
+                job.attach(conn)
+                with conn:
+                    for _ in conn.makefile("rb"):
+                        self.after(0, self._watch_event, job)
+            except (AdbError, OSError, ValueError):
+                pass
+        # Also the fallback when inotifywait exits (e.g. the folder was removed)
+        self.after(0, self._schedule_poll, job)
+
+    def _watch_event(self, job):
+        # Coalesce bursts of events (a recording writing many files) into one re-list
+        if job is self._watch_job and self._watch_after is None:
+            self._watch_after = self.after(300, self._watch_relist, job, False)
+
+    def _schedule_poll(self, job):
+        if job is self._watch_job and not job.cancelled and self._watch_after is None:
+            self._watch_after = self.after(int(self._watch_interval * 1000), self._watch_relist, job, True)
+
+    def _watch_relist(self, job, polling):
+        self._watch_after = None
+        if job is not self._watch_job:
+            return
+        path = self.current_path
+
+        def worker():
+            entries = self.list_dir(path)
+            self.after(0, self._watch_result, job, path, entries, polling)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _watch_result(self, job, path, entries, polling):
+        if job is not self._watch_job or path != self.current_path or self.search_active:
+            return
+        def signature(items):
+            return [(e.name, e.mode, e.size, e.mtime) for e in items]
+        changed = entries is not None and signature(entries) != signature(self.entries)
+        if changed:
+            self._show_listing(path, entries)
+        if polling:
+            self._watch_interval = WATCH_MIN if changed else min(self._watch_interval * 1.5, WATCH_MAX)
+            self._schedule_poll(job)
+
+    # --- Disk usage ---
+
+    def compute_sizes(self):
+        if self.search_active or not any(e.is_dir for e in self.entries):
+            return
+        self.cancel_sizes()
+        job = self._sizes_job = StreamJob()
+        self.path_label.config(text=f"{self.current_path} (computing sizes...)")
+        threading.Thread(target=self._sizes_thread, args=(self.device_id, self.current_path, job), daemon=True).start()
+
+    def cancel_sizes(self):
+        if self._sizes_job is not None:
+            self._sizes_job.cancel()
+            self._sizes_job = None
+
+    def _sizes_thread(self, device_id, path, job):
+        # One device-side `du` per subfolder, streamed so sizes show up as each one finishes.
+        # Looping on the device keeps the request short (service names are limited to 4K on API 23).
+        cmd = (f"cd {quote(path)} && for d in * .[!.]*; do "
+               "[ -d \"$d\" ] && [ ! -L \"$d\" ] && du -sk -- \"$d\"; done 2>/dev/null")
+        base = path.rstrip('/')
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            conn = get_client().open_exec(device_id, cmd)
+            job.attach(conn)
+            with conn:
+                for raw in conn.makefile("rb"):
+                    kb, _, name = raw.decode("utf-8", errors="replace").rstrip("\n").partition("\t")
+                    if not kb.isdigit() or not name:
+                        continue
+                    size = int(kb) * 1024
+                    self.dir_sizes.put(device_id, f"{base}/{name}", size)
+                    batch.append((name, size))
+                    if time.monotonic() - last_flush >= 0.2:
+                        self.after(0, self._add_sizes, path, batch)
+                        batch = []
+                        last_flush = time.monotonic()
+        except (AdbError, OSError, ValueError) as e:
+            if not job.cancelled:
+                print(f"Computing sizes of {path} failed: {e}")
+        self.after(0, self._add_sizes, path, batch, True)
+
+    def _add_sizes(self, path, sizes, done=False):
+        if path != self.current_path or self.search_active:
+            return
+        self.view_sizes.update(sizes)
+        if done:
+            total = sum(self.view_sizes.values()) + sum(e.size or 0 for e in self.entries if not e.is_dir)
+            self.path_label.config(text=f"{self.current_path} ({format_size(total)})")
+        if self.sort_key == "size":
+            self.apply_view()
+        elif self.virtual:
+            self._fill_virtual()
+        else:
+            for name, size in sizes:
+                item = self._row_items.get(name)
+                if item is not None:
+                    self.tree.set(item, "Size", format_size(size))
+
+    # --- View (sorting, filtering, chunked and virtual rendering) ---
+
+    def sort_by(self, key):
+        if self.sort_key == key:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_key, self.sort_reverse = key, False
+        self.apply_view()
+
+    def apply_view(self):
+        if self.search_active:
+            return
+        base = self.current_path.rstrip('/')
+        self.view_sizes = {}
+        for entry in self.entries:
+            if entry.is_dir:
+                size = self.dir_sizes.get(self.device_id, f"{base}/{entry.name}")
+                if size is not None:
+                    self.view_sizes[entry.name] = size
+        self.view_rows = view(self.entries, self.sort_key, self.sort_reverse, self.filter_var.get().strip(),
+                              self.view_sizes)
+        self._render()
+
+    def _clear_view(self):
+        self._render_gen += 1
+        self._row_items = {}
+        self._row_shown = {}
+        self._rendered_path = None
+        self.tree.delete(*self.tree.get_children())
+        self._set_virtual(False)
+
+    def _render(self):
+        rows = self.view_rows
+        virtual = len(rows) > VIRTUAL_THRESHOLD
+        if self._rendered_path == self.current_path and virtual == self.virtual:
+            # Same folder: keep items, selection and scroll position
+            if virtual:
+                self._fill_virtual()
             else:
-                # Fallback for unexpected formats (just show name if possible)
-                # Assuming last part is name
-                name = parts[-1]
-                self.tree.insert("", "end", text=f"❓ {name}", values=("?", "?"), tags=("file",))
+                self._diff_render()
+            return
+
+        self._clear_view()
+        self._rendered_path = self.current_path
+        if virtual:
+            self._set_virtual(True)
+            self.virtual_offset = 0
+            self._virtual_window = []
+            self._virtual_selected = set()
+            self._fill_virtual()
+            return
+
+        gen = self._render_gen
+        tree = self.tree
+
+        def insert_chunk(start):
+            if gen != self._render_gen:
+                return  # Superseded by a newer render
+            for entry in rows[start:start + INSERT_CHUNK]:
+                row = row_text(entry, self.view_sizes)
+                item = tree.insert("", "end", text=row[0], values=row[1], tags=row[2])
+                self._row_items[entry.name] = item
+                self._row_shown[item] = row
+            if start + INSERT_CHUNK < len(rows):
+                self.after(1, insert_chunk, start + INSERT_CHUNK)
+
+        insert_chunk(0)
+
+    def _diff_render(self):
+        """Brings the existing rows in line with view_rows: only changed rows are touched."""
+        self._render_gen += 1  # Supersedes a chunked insert still in progress
+        tree = self.tree
+        old = self._row_items
+        wanted = {entry.name for entry in self.view_rows}
+        gone = [item for name, item in old.items() if name not in wanted]
+        if gone:
+            tree.delete(*gone)
+        order = list(tree.get_children())
+        items = {}
+        shown = {}
+        for index, entry in enumerate(self.view_rows):
+            row = row_text(entry, self.view_sizes)
+            item = old.get(entry.name)
+            if item is None:
+                item = tree.insert("", index, text=row[0], values=row[1], tags=row[2])
+                order.insert(index, item)
+            else:
+                if self._row_shown.get(item) != row:
+                    tree.item(item, text=row[0], values=row[1], tags=row[2])
+                if index >= len(order) or order[index] != item:
+                    tree.move(item, "", index)
+                    order.remove(item)
+                    order.insert(index, item)
+            items[entry.name] = item
+            shown[item] = row
+        self._row_items = items
+        self._row_shown = shown
+
+    def _set_virtual(self, virtual):
+        self.virtual = virtual
+        if virtual:
+            # The scrollbar maps to the model, not to the (few) Treeview items
+            self.tree.configure(yscrollcommand="")
+            self.vsb.configure(command=self._virtual_scroll)
+        else:
+            self.tree.configure(yscrollcommand=self.vsb.set)
+            self.vsb.configure(command=self.tree.yview)
+
+    def _sync_virtual_selection(self):
+        """Folds the visible rows' selection into _virtual_selected (by name, listings get replaced)."""
+        items = self.tree.get_children()
+        selected = set(self.tree.selection())
+        for item, entry in zip(items, self._virtual_window):
+            if item in selected:
+                self._virtual_selected.add(entry.name)
+            else:
+                self._virtual_selected.discard(entry.name)
+
+    def _on_click(self, event):
+        # A plain click replaces the selection, including rows scrolled out of the window
+        if self.virtual and not event.state & (SHIFT_MASK | CONTROL_MASK):
+            self._virtual_selected.clear()
+
+    def _fill_virtual(self):
+        tree = self.tree
+        rows = self.view_rows
+        self._sync_virtual_selection()
+        items = tree.get_children()
+
+        # Heading takes about one row
+        count = min(max(1, tree.winfo_height() // ROW_HEIGHT - 1), len(rows))
+        offset = self.virtual_offset = max(0, min(self.virtual_offset, len(rows) - count))
+        window = self._virtual_window = rows[offset:offset + count]
+        for i, entry in enumerate(window):
+            text, values, tags = row_text(entry, self.view_sizes)
+            if i < len(items):
+                tree.item(items[i], text=text, values=values, tags=tags)
+            else:
+                tree.insert("", "end", text=text, values=values, tags=tags)
+        if len(items) > count:
+            tree.delete(*items[count:])
+
+        items = tree.get_children()
+        wanted = [items[i] for i, entry in enumerate(window) if entry.name in self._virtual_selected]
+        if set(wanted) != set(tree.selection()):
+            if wanted:
+                tree.selection_set(*wanted)
+            else:
+                tree.selection_remove(*tree.selection())
+        if rows:
+            self.vsb.set(offset / len(rows), (offset + count) / len(rows))
+
+    def _virtual_scroll(self, *args):
+        if args[0] == "moveto":
+            self.virtual_offset = int(float(args[1]) * len(self.view_rows))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= max(1, len(self._virtual_window) - 1)
+            self.virtual_offset += step
+        self._fill_virtual()
+
+    def _on_wheel(self, event):
+        if not self.virtual:
+            return None
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self._virtual_scroll("scroll", -3 if up else 3, "units")
+        return "break"
 
     def go_up(self):
         if self.current_path == "/": return
@@ -240,15 +746,8 @@ class DeviceExplorer(tk.Tk):
         if "search_result" in tags:
             # It's a full path
             full_path = item_text[2:] # Remove icon
-            # If it's a directory, go there. If file, open it.
-            # We need to check if it's a dir. Naive check: does it have an extension?
-            # Better: check our tree values or just try to open it.
-            # For now, let's assume if it has no extension it's a dir, or try to cd into it.
-            # Actually, let's just use the parent dir logic for navigation safety, 
-            # BUT if the user wants to open the file, we should try that.
-            
-            # Let's try to determine if it is a file or dir based on the icon we set
-            if "📁" in item_text:
+            # Search results carry their real type
+            if "dir" in tags:
                 # Directory -> Go to it
                 self.current_path = full_path
                 self.clear_search()
@@ -278,55 +777,139 @@ class DeviceExplorer(tk.Tk):
             self.open_file(full_path)
 
     def open_file(self, remote_path):
-        # Download to a temp folder and open
-        import tempfile
-        import shutil
-        
-        filename = os.path.basename(remote_path)
-        temp_dir = os.path.join(tempfile.gettempdir(), "Raven_Temp")
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-            
-        local_path = os.path.join(temp_dir, filename)
-        
-        # Use detected device
-        device_flag = f"-s {self.device_id}" if self.device_id else ""
-        cmd = f"adb {device_flag} pull \"{remote_path}\" \"{local_path}\""
-        
+        # Served from the local file cache unless the remote size/mtime changed
+        device_id = self.device_id
+        threading.Thread(target=self._open_file_thread, args=(device_id, remote_path), daemon=True).start()
+
+    def _open_file_thread(self, device_id, remote_path):
+        # Use detected device, streamed over a pooled sync session
         try:
-            subprocess.check_call(cmd, shell=True)
-            print(f"Downloaded to {local_path}")
+            with get_client().sync(device_id) as sync:
+                entry = sync.stat(remote_path)
+                if not entry.exists:
+                    raise AdbError(f"No such file: {remote_path}")
+                local_path = self.files.get(device_id, remote_path, entry.size, entry.mtime)
+                if local_path is None:
+                    local_path = self.files.store(device_id, remote_path, entry.size, entry.mtime,
+                                                  lambda f: sync.pull(remote_path, f))
+                    print(f"Downloaded to {local_path}")
             if os.name == 'posix':
                 subprocess.call(['xdg-open', local_path])
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to open file: {e}")
+            self.after(0, lambda: messagebox.showerror("Error", f"Failed to open file: {e}"))
+
+    def show_cache_stats(self):
+        stats = self.files.stats()
+        messagebox.showinfo("Cache Stats",
+                            f"Opened files: {stats['files']} cached, {stats['bytes'] // (1024 * 1024)} MB "
+                            f"of {stats['max_bytes'] // (1024 * 1024)} MB\n"
+                            f"File hits/misses this session: {stats['hits']} / {stats['misses']}\n"
+                            f"Listing hits/misses: {self.listings.hits} / {self.listings.misses}\n"
+                            f"Location: {self.files.root}")
+
+    def _selected_paths(self):
+        """Remote paths of all selected rows."""
+        if self.virtual:
+            # Also the selected rows currently scrolled out of the window
+            self._sync_virtual_selection()
+            return [f"{self.current_path}/{entry.name}".replace("//", "/")
+                    for entry in self.view_rows if entry.name in self._virtual_selected]
+        paths = []
+        for item in self.tree.selection():
+            item_text = self.tree.item(item, "text")
+            if "search_result" in self.tree.item(item, "tags"):
+                paths.append(item_text[2:])
+            else:
+                name = item_text[2:].rstrip('/') # Remove icon and trailing slash
+                paths.append(f"{self.current_path}/{name}".replace("//", "/"))
+        return paths
 
     def delete_selected(self):
-        selected = self.tree.selection()
-        if not selected: return
-        
-        item_text = self.tree.item(selected[0], "text")
-        tags = self.tree.item(selected[0], "tags")
-        
-        if "search_result" in tags:
-            remote_path = item_text[2:]
-            name = os.path.basename(remote_path)
-        else:
-            name = item_text[2:].rstrip('/') # Remove icon and trailing slash
-            remote_path = f"{self.current_path}/{name}".replace("//", "/")
-            
-        if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{name}'?"):
-            device_flag = f"-s {self.device_id}" if self.device_id else ""
-            cmd = f"adb {device_flag} shell rm -rf \"{remote_path}\""
+        paths = self._selected_paths()
+        if not paths: return
+        search = self.search_active
+
+        what = f"'{os.path.basename(paths[0])}'" if len(paths) == 1 else f"{len(paths)} items"
+        if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {what}?"):
             try:
-                subprocess.check_call(cmd, shell=True)
-                # Refresh
-                if "search_result" in tags:
-                    self.perform_search()
-                else:
-                    self.refresh()
+                rc, output = get_client().shell_session(self.device_id).run(
+                    "rm -rf " + " ".join(quote(p) for p in paths), timeout=60)
+                if rc != 0:
+                    raise AdbError(output.strip() or f"exit code {rc}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete: {e}")
+            for remote_path in paths:
+                self.listings.invalidate(self.device_id, remote_path)
+                self.dir_sizes.invalidate(self.device_id, remote_path)
+            # Refresh
+            if search:
+                self.perform_search()
+            else:
+                self.refresh(use_cache=False)
+
+    # --- Bulk transfers ---
+
+    def download_selected(self):
+        paths = self._selected_paths()
+        if not paths:
+            return
+        local_dir = filedialog.askdirectory(title="Download to")
+        if not local_dir:
+            return
+        device_id = self.device_id
+
+        def plan():
+            # Walking remote folders costs round-trips: keep it off the Tk thread
+            try:
+                jobs = plan_download(get_client(), device_id, paths, local_dir)
+            except (AdbError, OSError) as e:
+                self.after(0, lambda: messagebox.showerror("Error", f"Failed to list files: {e}"))
+                return
+            self.after(0, self._start_transfer, device_id, jobs, f"Download to {local_dir}", None)
+
+        threading.Thread(target=plan, daemon=True).start()
+
+    def download_archive(self):
+        # Bulk mode for folders with many small files: one tar stream instead of a request per file
+        paths = self._selected_paths()
+        if not paths:
+            return
+        local_dir = filedialog.askdirectory(title="Download to")
+        if not local_dir:
+            return
+        download = TarDownload(get_client(), self.device_id, paths, local_dir, self.compress_var.get())
+        ArchiveWindow(self, download.start(), f"Download to {local_dir}")
+
+    def upload_files(self):
+        paths = filedialog.askopenfilenames(title="Upload files")
+        if paths:
+            self._upload(list(paths))
+
+    def upload_folder(self):
+        path = filedialog.askdirectory(title="Upload folder")
+        if path:
+            self._upload([path])
+
+    def _upload(self, local_paths):
+        remote_dir = self.current_path
+        device_id = self.device_id
+        try:
+            jobs = plan_upload(local_paths, remote_dir)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to read files: {e}")
+            return
+
+        def done():
+            # Also drops the listings of uploaded subfolders
+            self.listings.invalidate(device_id, remote_dir)
+            self.dir_sizes.invalidate(device_id, remote_dir)
+            if self.current_path == remote_dir and not self.search_active:
+                self.refresh(use_cache=False)
+
+        self._start_transfer(device_id, jobs, f"Upload to {remote_dir}", done)
+
+    def _start_transfer(self, device_id, jobs, title, on_done):
+        TransferWindow(self, Transfer(get_client(), device_id, jobs).start(), title, on_done)
 
 if __name__ == "__main__":
     app = DeviceExplorer()
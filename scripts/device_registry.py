@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Push-based device table built on the adb `host:track-devices` stream.
+
+The adb server sends the full device list every time something changes, so
+we keep one long-lived connection open and update an in-memory table instead
+of re-running `adb devices`. Lookups are dict reads; listeners are called
+from the tracker thread as soon as a device connects, disconnects or changes
+state.
+"""
+import sys
+import threading
+
+from adb_client import AdbError, get_client, parse_device_list
+
+# Same physical emulator shows up twice when adb also connected over TCP
+EMULATOR_SERIAL = "emulator-5554"
+EMULATOR_ALIAS = "localhost:5555"
+
+# Reconnect backoff for the tracking stream (seconds)
+RETRY_MIN = 0.5
+RETRY_MAX = 5.0
+
+
+def dedupe_devices(serials):
+    """Drops localhost:5555 when emulator-5554 is also listed (same device)."""
+    if EMULATOR_SERIAL in serials and EMULATOR_ALIAS in serials:
+        return [s for s in serials if s != EMULATOR_ALIAS]
+    return list(serials)
+
+
+def pick_device(serials, prefer_physical=False):
+    """Chooses the most likely target among online serials."""
+    if not serials:
+        return None
+    if prefer_physical:
+        for serial in serials:
+            if not serial.startswith("emulator"):
+                return serial
+        return serials[0]
+    # Priority 1: Emulator-5554 (Default Pepper Emulator)
+    if EMULATOR_SERIAL in serials:
+        return EMULATOR_SERIAL
+    # Priority 2: Localhost:5555 (Alternative connection)
+    if EMULATOR_ALIAS in serials:
+        return EMULATOR_ALIAS
+    # Priority 3: First available device
+    return serials[0]
+
+
+class DeviceRegistry:
+    """In-memory table of serial -> state, kept current by track-devices."""
+
+    def __init__(self, client=None):
+        self.client = client or get_client()
+        self._states = {}  # serial -> state, in adb's order
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._track, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        conn = self._conn
+        if conn:
+            conn.close()
+
+    def wait_ready(self, timeout=3):
+        """Blocks until the first device list has arrived."""
+        return self._ready.wait(timeout)
+
+    def _track(self):
+        delay = RETRY_MIN
+        while not self._stop.is_set():
+            try:
+                self._conn = self.client.connect()
+                self._conn.send_request("host:track-devices")
+                delay = RETRY_MIN
+                while not self._stop.is_set():
+                    self._update(parse_device_list(self._conn.read_string()))
+            except (AdbError, OSError):
+                pass
+            finally:
+                if self._conn:
+                    self._conn.close()
+                    self._conn = None
+            if self._stop.is_set():
+                break
+            # Server went away: nothing is known about any device anymore
+            self._update([])
+            self._stop.wait(delay)
+            delay = min(delay * 2, RETRY_MAX)
+
+    def _update(self, devices):
+        new_states = dict(devices)
+        with self._lock:
+            old_states = self._states
+            self._states = new_states
+            listeners = list(self._listeners)
+        self._ready.set()
+
+        changes = []
+        for serial, state in new_states.items():
+            if old_states.get(serial) != state:
+                changes.append((serial, old_states.get(serial), state))
+        for serial, state in old_states.items():
+            if serial not in new_states:
+                changes.append((serial, state, None))
+                self.client.drop_device(serial)
+
+        for serial, old, new in changes:
+            for callback in listeners:
+                try:
+                    callback(serial, old, new)
+                except Exception as e:
+                    print(f"Device listener error: {e}", file=sys.stderr)
+
+    # --- Listeners ---
+
+    def add_listener(self, callback):
+        """callback(serial, old_state, new_state); a state of None means absent."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    # --- Lookups ---
+
+    def state(self, serial):
+        return self._states.get(serial)
+
+    def is_online(self, serial):
+        return self._states.get(serial) == "device"
+
+    def devices(self, dedupe=True):
+        """Online serials in adb's order."""
+        serials = [s for s, state in self._states.items() if state == "device"]
+        return dedupe_devices(serials) if dedupe else serials
+
+    def preferred(self, prefer_physical=False):
+        return pick_device(self.devices(), prefer_physical)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(wait=True):
+    """Returns the shared, already started registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DeviceRegistry().start()
+    if wait:
+        _registry.wait_ready()
+    return _registry
+
+
+if __name__ == "__main__":
+    # Used by the shell scripts so they share the same dedupe/priority rules
+    registry = get_registry()
+    if "--first" in sys.argv:
+        device = registry.preferred()
+        if device:
+            print(device)
+        else:
+            sys.exit(1)
+    else:
+        for serial in registry.devices():
+            print(serial)
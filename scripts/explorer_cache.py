@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Caches for the device explorer.
+
+ListingCache keeps directory listings in memory, keyed by (device serial,
+path). They expire after a TTL and are evicted least-recently-used first once
+the listing count or total row bound is reached, so long browsing sessions
+cannot grow memory without limit.
+
+DiskUsageCache keeps recursive directory sizes computed on the device.
+
+FileCache keeps files opened from the device on disk, keyed by serial, remote
+path, size and mtime: reopening an unchanged file is a local hit, a changed
+one gets a new key and is pulled again.
+"""
+import collections
+import hashlib
+import os
+import posixpath
+import shutil
+import threading
+import time
+
+# Configuration
+FILE_CACHE_DIR = os.path.expanduser("~/.cache/pepper_explorer/files")
+FILE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+LISTING_TTL = 30.0
+# Recursive sizes are costly to compute and change slowly
+DISK_USAGE_TTL = 600.0
+DISK_USAGE_MAX_ENTRIES = 20000
+MAX_ENTRIES = 256
+# Bound on the total number of cached rows over all listings
+MAX_ROWS = 200000
+
+
+class ListingCache:
+    def __init__(self, ttl=LISTING_TTL, max_entries=MAX_ENTRIES, max_rows=MAX_ROWS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._items = collections.OrderedDict()  # (serial, path) -> (stored_at, listing, size)
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(serial, path):
+        return serial, posixpath.normpath(path) if path else "/"
+
+    def get(self, serial, path):
+        """Returns the cached listing, or None if missing or expired."""
+        key = self._key(serial, path)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def contains(self, serial, path):
+        """Like get() but without touching LRU order or hit counters (for prefetch)."""
+        key = self._key(serial, path)
+        with self._lock:
+            item = self._items.get(key)
+            return item is not None and time.monotonic() - item[0] <= self.ttl
+
+    def put(self, serial, path, listing, size=None):
+        """`size` defaults to len(listing)."""
+        key = self._key(serial, path)
+        size = len(listing) if size is None else size
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = (time.monotonic(), listing, size)
+            self._rows += size
+            while self._items and (len(self._items) > self.max_entries or self._rows > self.max_rows):
+                self._remove(next(iter(self._items)))
+
+    def _remove(self, key):
+        # Called with the lock held
+        self._rows -= self._items.pop(key)[2]
+
+    def invalidate(self, serial, path):
+        """Drops `path`, everything below it and its parent listing."""
+        serial, path = self._key(serial, path)
+        prefix = path.rstrip("/") + "/"
+        parent = posixpath.dirname(path)
+        with self._lock:
+            for key in [k for k in self._items
+                        if k[0] == serial and (k[1] == path or k[1] == parent or k[1].startswith(prefix))]:
+                self._remove(key)
+
+    def drop_device(self, serial):
+        with self._lock:
+            for key in [k for k in self._items if k[0] == serial]:
+                self._remove(key)
+
+
+class DiskUsageCache:
+    """Recursive size in bytes per (serial, directory), LRU-bounded.
+
+    A change below a directory changes it and every ancestor, so invalidate()
+    drops those as well as the subtree.
+    """
+
+    def __init__(self, ttl=DISK_USAGE_TTL, max_entries=DISK_USAGE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items = collections.OrderedDict()  # (serial, path) -> (stored_at, size)
+        self._lock = threading.Lock()
+
+    def get(self, serial, path):
+        key = ListingCache._key(serial, path)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, serial, path, size):
+        key = ListingCache._key(serial, path)
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.monotonic(), size)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, serial, path):
+        serial, path = ListingCache._key(serial, path)
+        prefix = path.rstrip("/") + "/"
+        ancestors = set()
+        parent = path
+        while parent != "/":
+            parent = posixpath.dirname(parent)
+            ancestors.add(parent)
+        with self._lock:
+            for key in [k for k in self._items
+                        if k[0] == serial and (k[1] == path or k[1] in ancestors or k[1].startswith(prefix))]:
+                del self._items[key]
+
+    def drop_device(self, serial):
+        with self._lock:
+            for key in [k for k in self._items if k[0] == serial]:
+                del self._items[key]
+
+
+class FileCache:
+    """On-disk cache of pulled files, bounded by total size (LRU).
+
+    Each file lives in <root>/<key>/<original name>, so the opening app still
+    sees the real name and extension. A directory's mtime is its last use.
+    """
+
+    def __init__(self, root=FILE_CACHE_DIR, max_bytes=FILE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(serial, remote_path, size, mtime):
+        return hashlib.sha1(f"{serial}\0{remote_path}\0{size}\0{mtime}".encode("utf-8")).hexdigest()
+
+    def _path(self, key, remote_path):
+        return os.path.join(self.root, key, posixpath.basename(remote_path.rstrip("/")) or "file")
+
+    def get(self, serial, remote_path, size, mtime):
+        """Local path of the cached copy, or None."""
+        key = self.key(serial, remote_path, size, mtime)
+        path = self._path(key, remote_path)
+        if os.path.exists(path):
+            os.utime(os.path.dirname(path))
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def store(self, serial, remote_path, size, mtime, fetch):
+        """Calls fetch(fileobj) to fill a new entry and returns its local path."""
+        key = self.key(serial, remote_path, size, mtime)
+        path = self._path(key, remote_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".part"
+        try:
+            with open(temp_path, "wb") as f:
+                fetch(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict(keep=key)
+        return path
+
+    def _entries(self):
+        """[(last_used, size, key)] of all cached files."""
+        entries = []
+        try:
+            keys = os.listdir(self.root)
+        except FileNotFoundError:
+            return entries
+        for key in keys:
+            entry_dir = os.path.join(self.root, key)
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+                entries.append((os.path.getmtime(entry_dir), size, key))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self, keep=None):
+        """Removes least recently used files until the cache fits max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self):
+        entries = self._entries()
+        return {"files": len(entries), "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
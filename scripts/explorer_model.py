@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Directory listing model for the device explorer (no Tk code).
+
+Listings come from the sync protocol as typed adb_client.DirEntry records
+(mode, size, mtime, name), fetched on a background thread; sorting and
+filtering then work on these in-memory lists, so the view can be rearranged
+without another device round-trip.
+"""
+import time
+
+from adb_client import DirEntry
+
+
+def read_dir(sync, path):
+    """Lists path over a SyncConnection as typed DirEntry records.
+
+    Symlinks to directories (e.g. /sdcard, /etc) are reported as directories
+    so they can be opened; other links keep their link mode.
+    """
+    base = path.rstrip('/')
+    entries = sync.list(base + '/')
+    links = [i for i, entry in enumerate(entries) if entry.is_link]
+    # STAT with a trailing slash follows the link; /system/bin has hundreds, so pipeline them
+    targets = sync.stat_many([f"{base}/{entries[i].name}/" for i in links])
+    for i, target in zip(links, targets):
+        if target.is_dir:
+            entry = entries[i]
+            entries[i] = DirEntry(entry.name, target.mode, entry.size, entry.mtime)
+    return entries
+
+
+# `stat -c` format for typed records: hex st_mode, size, mtime, path
+STAT_FORMAT = "%f %s %Y %n"
+
+
+def parse_stat_line(line):
+    """Parses one STAT_FORMAT line into a DirEntry named by its full path, or None."""
+    parts = line.split(" ", 3)
+    if len(parts) != 4:
+        return None
+    try:
+        return DirEntry(parts[3], int(parts[0], 16), int(parts[1]), int(parts[2]))
+    except ValueError:
+        return None
+
+
+def entry_size(entry, sizes=None):
+    """Bytes shown for an entry: directories only have a size once computed (see `sizes`)."""
+    if entry.is_dir:
+        return sizes.get(entry.name) if sizes else None
+    return entry.size
+
+
+SORT_KEYS = {
+    "name": lambda e: e.name.lower(),
+    "date": lambda e: e.mtime or 0,
+}
+
+
+def view(entries, key="name", reverse=False, text=None, sizes=None):
+    """Filtered and sorted copy of entries. Directories come first, except when
+    sorting by size, where the biggest items matter whatever their type.
+    `sizes` maps directory names to computed recursive sizes."""
+    if text:
+        text = text.lower()
+        entries = [e for e in entries if text in e.name.lower()]
+    if key == "size":
+        def sort_key(e):
+            size = entry_size(e, sizes)
+            return -1 if size is None else size
+        return sorted(entries, key=sort_key, reverse=reverse)
+    rows = sorted(entries, key=SORT_KEYS[key], reverse=reverse)
+    rows.sort(key=lambda e: not e.is_dir)  # stable: keeps the order within each group
+    return rows
+
+
+def format_size(size):
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_mtime(mtime):
+    return "-" if mtime is None else time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+
+
+def row_text(entry, sizes=None):
+    """(text, values, tags) for a Treeview row."""
+    if not entry.exists:
+        return f"❓ {entry.name}", ("?", "?"), ("file",)
+    icon = "📁 " if entry.is_dir else "📄 "
+    return (f"{icon}{entry.name}", (format_size(entry_size(entry, sizes)), format_mtime(entry.mtime)),
+            ("dir" if entry.is_dir else "file",))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Flavor discovery for app/build.gradle and app/build.gradle.kts.
+
+The build file is tokenized once (comments and strings are skipped as whole
+tokens, so braces inside them do not matter) and the Groovy and Kotlin DSL
+forms are handled by the same statement walker:
+
+    flavorDimensions "mode", "device"        flavorDimensions += listOf("mode", "device")
+    prod { dimension 'mode' }                create("prod") { dimension = "mode" }
+    debug { applicationIdSuffix '.debug' }   getByName("debug") { applicationIdSuffix = ".debug" }
+
+Results are cached on disk by file path, size and mtime (falling back to a
+content hash when only the mtime changed, e.g. after a checkout), so repeated
+launches skip reading and parsing the file.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+
+from build_cache import load_entries, save_entries
+
+# Configuration
+CACHE_NAME = "gradle_parse.json"
+CACHE_MAX_ENTRIES = 64
+# Bump when the parser output changes, so old cache entries are ignored
+PARSER_VERSION = 1
+# Gradle always defines these, even when buildTypes does not mention them
+DEFAULT_BUILD_TYPES = ("debug", "release")
+# Kotlin DSL container calls whose string argument names the block
+NAMED_CALLS = {"create", "register", "getByName", "maybeCreate", "named"}
+
+_TOKEN = re.compile(r'''
+    (?P<skip>[ \t\r\f]+|\\\n|//[^\n]*|/\*.*?\*/)
+  | (?P<newline>\n)
+  | (?P<string>"""(?:.|\n)*?"""|\'\'\'(?:.|\n)*?\'\'\'|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<punct>.)
+''', re.VERBOSE | re.DOTALL)
+
+
+def tokenize(text):
+    """Yields (kind, value) pairs; string values are returned without quotes."""
+    for match in _TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind == "skip":
+            continue
+        value = match.group()
+        if kind == "string":
+            quote_len = 3 if value[:3] in ('"""', "'''") else 1
+            value = value[quote_len:-quote_len]
+        yield kind, value
+
+
+def _strings(stmt):
+    return [value for kind, value in stmt if kind == "string"]
+
+
+def _block_name(stmt):
+    """Name of the block opened after stmt: `prod {`, `create("prod") {`."""
+    if not stmt or stmt[0][0] != "ident":
+        return None
+    if stmt[0][1] in NAMED_CALLS:
+        names = _strings(stmt)
+        return names[0] if names else None
+    return stmt[0][1]
+
+
+def parse_text(text):
+    """Parses build file contents into a plain dict (JSON-serializable):
+
+    dimensions: [dimension], flavors: {dimension: [flavor]},
+    build_types: [build type], suffixes: {flavor or build type: applicationIdSuffix}
+    """
+    dimensions = []
+    flavor_dims = {}  # flavor -> dimension (None until seen), in declaration order
+    build_types = list(DEFAULT_BUILD_TYPES)
+    suffixes = {}
+
+    stack = []  # Names of the enclosing blocks
+    stmt = []  # Tokens of the current statement
+    depth = 0  # Open ( and [ inside the current statement
+
+    def end_statement():
+        if not stmt or stmt[0][0] != "ident":
+            return
+        keyword = stmt[0][1]
+        parent = stack[-2] if len(stack) >= 2 else None
+        if keyword == "flavorDimensions" and parent != "productFlavors":
+            for dim in _strings(stmt):
+                if dim not in dimensions:
+                    dimensions.append(dim)
+        elif keyword == "dimension" and parent == "productFlavors":
+            values = _strings(stmt)
+            if values:
+                flavor_dims[stack[-1]] = values[0]
+        elif keyword == "applicationIdSuffix" and parent in ("productFlavors", "buildTypes"):
+            values = _strings(stmt)
+            if values:
+                suffixes[stack[-1]] = values[0]
+
+    for kind, value in tokenize(text):
+        if kind == "newline":
+            # Statements continue over newlines inside (...) / [...] and after a trailing , or =
+            if depth == 0 and not (stmt and stmt[-1] in (("punct", ","), ("punct", "="))):
+                end_statement()
+                stmt = []
+            continue
+        if kind == "punct":
+            if value in "([":
+                depth += 1
+            elif value in ")]":
+                depth = max(depth - 1, 0)
+            elif value == "{":
+                name = _block_name(stmt)
+                stack.append(name)
+                # `all { }` / `configureEach { }` apply to every element, they are not one
+                if name and name not in ("all", "configureEach"):
+                    if len(stack) >= 2 and stack[-2] == "productFlavors":
+                        flavor_dims.setdefault(name, None)
+                    elif len(stack) >= 2 and stack[-2] == "buildTypes" and name not in build_types:
+                        build_types.append(name)
+                stmt, depth = [], 0
+                continue
+            elif value == "}":
+                end_statement()
+                if stack:
+                    stack.pop()
+                stmt, depth = [], 0
+                continue
+            elif value == ";":
+                end_statement()
+                stmt, depth = [], 0
+                continue
+        stmt.append((kind, value))
+    end_statement()
+
+    # Dimensions only referenced by flavors still count; with a single dimension
+    # Gradle assigns it to flavors that do not name one
+    for dim in flavor_dims.values():
+        if dim and dim not in dimensions:
+            dimensions.append(dim)
+    flavors = {}
+    for name, dim in flavor_dims.items():
+        if dim is None and len(dimensions) == 1:
+            dim = dimensions[0]
+        if dim:
+            flavors.setdefault(dim, []).append(name)
+    return {"dimensions": dimensions, "flavors": flavors, "build_types": build_types, "suffixes": suffixes}
+
+
+def _cap(name):
+    return name[:1].upper() + name[1:]
+
+
+def flavor_name(dimensions, selected):
+    """Combined flavor name in dimension order, as in output folders: prodPepper."""
+    names = [selected[dim] for dim in dimensions if selected.get(dim)]
+    return "".join(name if i == 0 else _cap(name) for i, name in enumerate(names))
+
+
+def assemble_task(dimensions, selected, build_type):
+    """assemble[Flavor1][Flavor2][BuildType]; flavor order must match dimensions order."""
+    return f"assemble{_cap(flavor_name(dimensions, selected))}{_cap(build_type)}"
+
+
+def find_gradle_file(app_dir):
+    """app/build.gradle or app/build.gradle.kts, or None."""
+    for name in ("build.gradle", "build.gradle.kts"):
+        path = os.path.join(app_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def parse_gradle(gradle_path):
+    """parse_text() of gradle_path, served from the on-disk cache when the file is unchanged."""
+    path = os.path.abspath(gradle_path)
+    st = os.stat(path)
+    cache = load_entries(CACHE_NAME, PARSER_VERSION)
+    entry = cache.get(path)
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        return entry["result"]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if entry and entry["sha1"] == digest:
+        result = entry["result"]
+    else:
+        result = parse_text(data.decode("utf-8", errors="replace"))
+    cache.pop(path, None)
+    cache[path] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": digest, "result": result}
+    save_entries(CACHE_NAME, PARSER_VERSION, cache, CACHE_MAX_ENTRIES)
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <build.gradle[.kts]>")
+        sys.exit(1)
+    print(json.dumps(parse_gradle(sys.argv[1]), indent=2))
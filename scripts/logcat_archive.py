@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Segmented, compressed logcat archive with a sparse per-segment index.
+
+Layout:
+    ~/.pepper_logcat_archive/<device>/<session>/seg-00001.tsv.gz
+                                               /index.jsonl
+
+Each segment holds at most SEGMENT_ENTRIES entries or SEGMENT_SECONDS of log
+time. When a segment is closed, one line is appended to index.jsonl with its
+time range and the tags, pids and levels it contains, so a query only
+decompresses the segments that can match.
+
+Usage:
+    logcat_archive.py list [--device SERIAL]
+    logcat_archive.py query [--device SERIAL] [--session ID] [--since 02:00] [--until 02:15]
+                            [--level E] [--tag X] [--pid N] [--grep TEXT]
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+
+from logcat_parser import (LEVEL_RANK, LogEntry, all_of, entry_timestamp, format_entry, level_at_least,
+                           message_contains, parse_tag_list, pid_in, tag_in)
+
+ARCHIVE_DIR = os.path.expanduser("~/.pepper_logcat_archive")
+INDEX_FILE = "index.jsonl"
+SEGMENT_ENTRIES = 20000
+SEGMENT_SECONDS = 300
+# Cheap and good enough for text logs; level 9 costs several times more CPU
+COMPRESS_LEVEL = 4
+
+_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\t": "\\t", "\r": "\\r"}
+_UNESCAPE_RE = re.compile(r"\\(.)")
+_UNESCAPES = {"\\": "\\", "n": "\n", "t": "\t", "r": "\r"}
+
+
+def _escape(text):
+    if "\\" in text or "\n" in text or "\t" in text or "\r" in text:
+        return "".join(_ESCAPES.get(c, c) for c in text)
+    return text
+
+
+def _unescape(text):
+    if "\\" not in text:
+        return text
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def device_dirname(serial):
+    """Serials like 192.168.1.5:5555 are not valid directory names everywhere."""
+    return re.sub(r"[^\w.-]", "_", serial)
+
+
+class LogArchive:
+    """Appends entries of one monitor session to the archive."""
+
+    def __init__(self, serial, root=ARCHIVE_DIR, session=None):
+        self.session = session or time.strftime("%Y%m%d-%H%M%S")
+        self.dir = os.path.join(root, device_dirname(serial), self.session)
+        os.makedirs(self.dir, exist_ok=True)
+        self.segment_no = 0
+        self.out = None
+        self._reset_segment()
+
+    def _reset_segment(self):
+        self.count = 0
+        self.ts_min = None
+        self.ts_max = None
+        self.tags = set()
+        self.pids = set()
+        self.levels = set()
+
+    def _open_segment(self):
+        self.segment_no += 1
+        self.segment_name = f"seg-{self.segment_no:05d}.tsv.gz"
+        self.out = gzip.open(os.path.join(self.dir, self.segment_name), "wt",
+                             compresslevel=COMPRESS_LEVEL, encoding="utf-8")
+
+    def append(self, entry):
+        ts = entry_timestamp(entry)
+        if self.out is not None and (self.count >= SEGMENT_ENTRIES or ts - self.ts_min >= SEGMENT_SECONDS):
+            self._close_segment()
+        if self.out is None:
+            self._open_segment()
+            self.ts_min = ts
+        self.count += 1
+        # Buffer replays and clock changes can go backwards
+        if ts < self.ts_min:
+            self.ts_min = ts
+        if self.ts_max is None or ts > self.ts_max:
+            self.ts_max = ts
+        self.tags.add(entry.tag)
+        self.pids.add(entry.pid)
+        self.levels.add(entry.level)
+        self.out.write(f"{ts:.3f}\t{entry.pid}\t{entry.tid}\t{entry.level}\t{_escape(entry.tag)}\t{_escape(entry.message)}\n")
+
+    def _close_segment(self):
+        self.out.close()
+        self.out = None
+        record = {
+            "file": self.segment_name,
+            "count": self.count,
+            "ts_min": self.ts_min,
+            "ts_max": self.ts_max,
+            "tags": sorted(self.tags),
+            "pids": sorted(self.pids),
+            "levels": "".join(sorted(self.levels, key=LEVEL_RANK.get)),
+        }
+        with open(os.path.join(self.dir, INDEX_FILE), "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._reset_segment()
+
+    def close(self):
+        if self.out is not None:
+            self._close_segment()
+
+
+# --- Queries ---
+
+def read_index(session_dir):
+    """Returns index records plus unindexed segments (left open by a crash)."""
+    records = []
+    path = os.path.join(session_dir, INDEX_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    indexed = {r["file"] for r in records}
+    for name in sorted(os.listdir(session_dir)):
+        if name.startswith("seg-") and name not in indexed:
+            records.append({"file": name, "count": None})
+    return records
+
+
+def segment_may_match(record, since=None, until=None, tags=None, pids=None, level=None):
+    if record.get("count") is None:
+        return True  # No index for it: must scan
+    if since is not None and record["ts_max"] < since:
+        return False
+    if until is not None and record["ts_min"] > until:
+        return False
+    if tags and not tags.intersection(record["tags"]):
+        return False
+    if pids and not pids.intersection(record["pids"]):
+        return False
+    if level and not any(LEVEL_RANK[lv] >= LEVEL_RANK[level] for lv in record["levels"]):
+        return False
+    return True
+
+
+def read_segment(path):
+    """Yields LogEntry tuples from one segment; tolerates a truncated tail."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t", 5)
+                if len(parts) != 6:
+                    continue
+                ts = float(parts[0])
+                stamp = time.localtime(ts)
+                yield LogEntry(time.strftime("%m-%d", stamp),
+                               f"{time.strftime('%H:%M:%S', stamp)}.{int(ts * 1000) % 1000:03d}",
+                               int(parts[1]), int(parts[2]), parts[3],
+                               _unescape(parts[4]), _unescape(parts[5]), None, ts)
+    except (EOFError, OSError):
+        return
+
+
+def session_dirs(root, device=None, session=None):
+    if not os.path.isdir(root):
+        return []
+    devices = [device_dirname(device)] if device else sorted(os.listdir(root))
+    dirs = []
+    for dev in devices:
+        dev_dir = os.path.join(root, dev)
+        if not os.path.isdir(dev_dir):
+            continue
+        for name in sorted(os.listdir(dev_dir)):
+            if session is None or name == session:
+                dirs.append(os.path.join(dev_dir, name))
+    return dirs
+
+
+def query(root=ARCHIVE_DIR, device=None, session=None, since=None, until=None,
+          level=None, tags=None, pids=None, grep=None):
+    """Yields matching entries, reading only segments whose index can match."""
+    entry_filter = all_of(
+        level_at_least(level) if level else None,
+        tag_in(tags) if tags else None,
+        pid_in(pids) if pids else None,
+        message_contains(grep) if grep else None,
+        (lambda e: e.ts >= since) if since is not None else None,
+        (lambda e: e.ts <= until) if until is not None else None,
+    )
+    for session_dir in session_dirs(root, device, session):
+        for record in read_index(session_dir):
+            if not segment_may_match(record, since, until, tags, pids, level):
+                continue
+            for entry in read_segment(os.path.join(session_dir, record["file"])):
+                if entry_filter(entry):
+                    yield entry
+
+
+def parse_time(value, now=None):
+    """Accepts 'HH:MM[:SS]' (latest occurrence not in the future) or 'YYYY-MM-DD HH:MM[:SS]'."""
+    if value is None:
+        return None
+    now = now or time.time()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            clock = time.strptime(value, fmt)
+        except ValueError:
+            continue
+        today = time.localtime(now)
+        ts = time.mktime((today.tm_year, today.tm_mon, today.tm_mday,
+                          clock.tm_hour, clock.tm_min, clock.tm_sec, 0, 0, -1))
+        return ts - 86400 if ts > now else ts
+    raise ValueError(f"Unrecognized time: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the logcat archive written by monitor_logcat.py --archive')
+    parser.add_argument('--root', default=ARCHIVE_DIR, help='Archive directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    list_p = sub.add_parser('list', help='List archived sessions')
+    list_p.add_argument('--device', help='Device serial')
+
+    query_p = sub.add_parser('query', help='Print matching entries')
+    query_p.add_argument('--device', help='Device serial')
+    query_p.add_argument('--session', help='Session id (see list)')
+    query_p.add_argument('--since', help="Start time, 'HH:MM' or 'YYYY-MM-DD HH:MM'")
+    query_p.add_argument('--until', help="End time, 'HH:MM' or 'YYYY-MM-DD HH:MM'")
+    query_p.add_argument('--level', type=str.upper, choices=list("VDIWEF"), help='Minimum priority')
+    query_p.add_argument('--tag', action='append', help='Tag (repeatable or comma separated)')
+    query_p.add_argument('--pid', type=int, action='append', help='PID (repeatable)')
+    query_p.add_argument('--grep', help='Substring of the message')
+    query_p.add_argument('--no-color', action='store_true', help='Plain output')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for session_dir in session_dirs(args.root, args.device):
+            records = read_index(session_dir)
+            indexed = [r for r in records if r.get("count") is not None]
+            count = sum(r["count"] for r in indexed)
+            span = ""
+            if indexed:
+                start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(min(r["ts_min"] for r in indexed)))
+                end = time.strftime("%H:%M:%S", time.localtime(max(r["ts_max"] for r in indexed)))
+                span = f"{start} -> {end}"
+            device, session = session_dir.split(os.sep)[-2:]
+            print(f"{device}\t{session}\t{len(records)} segments\t{count} entries\t{span}")
+        return
+
+    try:
+        since = parse_time(args.since)
+        until = parse_time(args.until)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if since is not None and until is not None and until < since:
+        # "23:50 -> 00:10" crosses midnight
+        until += 86400
+
+    try:
+        for entry in query(args.root, args.device, args.session, since, until, args.level,
+                           parse_tag_list(args.tag) or None, set(args.pid) if args.pid else None, args.grep):
+            sys.stdout.write(format_entry(entry, color=not args.no_color))
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Watches several devices at once on a single asyncio event loop.
+
+Each device gets its own logcat stream, PID tracking and package filter.
+Entries from all devices are merged in (clock-corrected) timestamp order
+behind a short reorder window and printed with a per-device prefix.
+
+Usage:
+    logcat_mux.py [package] [--device SERIAL[=PACKAGE] ...] [--level W] [--tag X] [--binary]
+
+Without --device, every online device is watched.
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import sys
+import time
+
+from adb_client import AdbError, open_service_async, quote, shell_async
+from device_registry import get_registry
+from logcat_parser import (BinaryLogDecoder, DeviceClock, all_of, any_of, format_entry, level_at_least,
+                           message_contains, parse_lifecycle, parse_line, parse_tag_list, pid_in, tag_in)
+from logcat_writer import BatchedWriter
+from monitor_logcat import POLL_MAX, POLL_MIN, Colors, load_active_config
+
+# How long entries are held back so slower streams can slot in before them
+REORDER_DELAY = 0.25
+EMIT_INTERVAL = 0.05
+
+PREFIX_COLORS = [Colors.CYAN, Colors.HEADER, Colors.BLUE, Colors.GREEN, Colors.WARNING]
+
+
+class DeviceFeed:
+    """Stream, PID tracking and filter state for one device."""
+
+    def __init__(self, serial, package, color, level=None, tags=None, binary=False):
+        self.serial = serial
+        self.package = package
+        self.binary = binary
+        self.prefix = f"{color}[{serial}]{Colors.ENDC} "
+        self.writer = None  # set by LogMux
+        self.pids = set()
+        self.current_pid = None
+        # Maps entry times to the host clock, so merged ordering is not skewed by device clocks or timezones
+        self.clock = DeviceClock()
+        self.filter = all_of(
+            any_of(pid_in(self.pids), message_contains(package)),
+            level_at_least(level) if level else None,
+            tag_in(tags) if tags else None,
+        )
+
+    def note(self, text, color):
+        self.writer.write_control(f"{self.prefix}{color}>>> {text} <<<{Colors.ENDC}\n")
+
+    def set_pid(self, new_pid, expected=None):
+        old_pid = self.current_pid
+        if new_pid == old_pid or (expected is not None and old_pid != expected):
+            return False
+        self.current_pid = new_pid
+        if new_pid:
+            self.pids.add(new_pid)
+        self.pids.discard(old_pid)
+        if new_pid:
+            verb = "App Started" if old_pid is None else "App Restarted"
+            self.note(f"{verb}: {self.package} (PID: {new_pid})", Colors.GREEN if old_pid is None else Colors.CYAN)
+        else:
+            self.note(f"App Closed: {self.package}", Colors.WARNING)
+        return True
+
+    def track(self, entry):
+        if entry.tag != "ActivityManager":
+            return
+        event = parse_lifecycle(entry.message)
+        if event is None or event[1] != self.package:
+            return
+        if event[0] == "start":
+            self.set_pid(event[2])
+        else:
+            self.set_pid(None, expected=event[2])
+
+    async def get_pid(self):
+        """The app's PID, None if not running; raises if the query failed."""
+        pids = (await shell_async(self.serial, f"pidof {quote(self.package)}")).split()
+        return int(pids[-1]) if pids else None
+
+    async def measure_clock(self):
+        try:
+            before = time.time()
+            out = await shell_async(self.serial, DeviceClock.COMMAND)
+            self.clock = DeviceClock.from_output(out, before, time.time())
+        except (AdbError, OSError):
+            self.clock = DeviceClock()
+
+    async def poll_pid(self):
+        """Fallback PID polling with backoff (lifecycle lines do the real work)."""
+        interval = POLL_MIN
+        while True:
+            try:
+                pid = await self.get_pid()
+            except (AdbError, OSError, ValueError):
+                changed = False  # A failed query says nothing: keep the PID from the log stream
+            else:
+                changed = self.set_pid(pid)
+            if changed:
+                interval = POLL_MIN
+            else:
+                interval = min(interval * 2, POLL_MAX)
+            await asyncio.sleep(interval)
+
+    async def entries(self):
+        """Async iterator over this device's parsed entries."""
+        cmd = "logcat " + ("-B" if self.binary else "-v threadtime")
+        reader, writer = await open_service_async(self.serial, ("exec:" if self.binary else "shell:") + cmd)
+        try:
+            if self.binary:
+                decoder = BinaryLogDecoder()
+                while True:
+                    data = await reader.read(65536)
+                    if not data:
+                        return
+                    for entry in decoder.feed(data):
+                        yield entry
+            else:
+                while True:
+                    raw = await reader.readline()
+                    if not raw:
+                        return
+                    entry = parse_line(raw.decode("utf-8", errors="replace").rstrip("\r\n") + "\n")
+                    if entry is not None:
+                        yield entry
+        finally:
+            writer.close()
+
+
+class LogMux:
+    """Merges entries of several DeviceFeeds in timestamp order."""
+
+    def __init__(self, feeds):
+        self.feeds = feeds
+        self.heap = []
+        self.seq = itertools.count()
+        # Rendering happens off the event loop so a slow terminal never stalls the streams
+        self.writer = BatchedWriter()
+        for feed in feeds:
+            feed.writer = self.writer
+
+    async def read_feed(self, feed):
+        await feed.measure_clock()
+        poller = asyncio.ensure_future(feed.poll_pid())
+        try:
+            async for entry in feed.entries():
+                # PID switches on the very line that announces it
+                feed.track(entry)
+                if feed.filter(entry):
+                    ts = feed.clock.host_time(entry)
+                    heapq.heappush(self.heap, (ts, next(self.seq), time.monotonic(), feed, entry))
+        except (AdbError, OSError) as e:
+            feed.note(f"Stream error: {e}", Colors.FAIL)
+        finally:
+            poller.cancel()
+        feed.note("Stream ended", Colors.WARNING)
+
+    def emit(self, flush_all=False):
+        cutoff = time.monotonic() - REORDER_DELAY
+        heap = self.heap
+        write = self.writer.write
+        while heap and (flush_all or heap[0][2] <= cutoff):
+            _, _, _, feed, entry = heapq.heappop(heap)
+            write("".join(feed.prefix + line for line in format_entry(entry).splitlines(True)), entry.level)
+
+    async def run(self):
+        readers = [asyncio.ensure_future(self.read_feed(feed)) for feed in self.feeds]
+        try:
+            while not all(r.done() for r in readers):
+                await asyncio.sleep(EMIT_INTERVAL)
+                self.emit()
+        finally:
+            for r in readers:
+                r.cancel()
+            self.emit(flush_all=True)
+            self.writer.close()
+
+
+def parse_device_args(values, default_package):
+    """'serial' or 'serial=package' -> [(serial, package)]."""
+    targets = []
+    for value in values:
+        serial, _, package = value.partition("=")
+        targets.append((serial, package or default_package))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Filtered logcat for several devices at once')
+    parser.add_argument('package', nargs='?', help='Package name (default: PEPPER_PACKAGE from .active_config)')
+    parser.add_argument('--device', action='append', default=[], help='SERIAL or SERIAL=PACKAGE (repeatable, default: all online)')
+    parser.add_argument('--level', type=str.upper, choices=list("VDIWEF"), help='Minimum priority to show')
+    parser.add_argument('--tag', action='append', help='Only show these tags (repeatable or comma separated)')
+    parser.add_argument('--binary', action='store_true', help='Read binary logcat (-B) and color on the host')
+    args = parser.parse_args()
+
+    package = args.package or load_active_config().get("PEPPER_PACKAGE")
+    targets = parse_device_args(args.device, package)
+    if not targets:
+        targets = [(serial, package) for serial in get_registry().devices()]
+    if not targets:
+        print(f"{Colors.FAIL}Error: No Android device found.{Colors.ENDC}")
+        sys.exit(1)
+    missing = [serial for serial, pkg in targets if not pkg]
+    if missing:
+        print(f"{Colors.FAIL}Error: No package for {', '.join(missing)} (use SERIAL=PACKAGE or .active_config){Colors.ENDC}")
+        sys.exit(1)
+
+    tags = parse_tag_list(args.tag)
+    feeds = [DeviceFeed(serial, pkg, PREFIX_COLORS[i % len(PREFIX_COLORS)], args.level, tags, args.binary)
+             for i, (serial, pkg) in enumerate(targets)]
+
+    print(f"{Colors.HEADER}========================================{Colors.ENDC}")
+    for feed in feeds:
+        print(f"{Colors.HEADER}   {feed.serial}: {feed.package}{Colors.ENDC}")
+    print(f"{Colors.HEADER}========================================{Colors.ENDC}")
+    print(">>> MONITOR STARTED <<<", flush=True)
+
+    try:
+        asyncio.run(LogMux(feeds).run())
+    except KeyboardInterrupt:
+        print(f"\n{Colors.BLUE}Stopping monitor...{Colors.ENDC}")
+
+
+if __name__ == "__main__":
+    main()
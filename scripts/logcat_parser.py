@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""Structured parsing and filtering of logcat output.
+
+One precompiled regex splits each `-v threadtime` line into fields, and
+filters are small predicates over those fields, so matching never has to guess
+from substrings (e.g. a PID that happens to appear inside a message or a
+timestamp). `logcat -B` binary entries decode into the same LogEntry, with
+color added on the host when printing.
+"""
+import re
+import struct
+import time
+from collections import namedtuple
+
+# Priority letters in increasing severity
+LEVELS = "VDIWEF"
+LEVEL_RANK = {level: rank for rank, level in enumerate(LEVELS)}
+LEVEL_RANK["A"] = LEVEL_RANK["F"]  # "Assert" is shown as F or A depending on version
+
+# "01-31 12:34:56.789  1234  1250 I ActivityManager: message"
+# An optional ANSI color prefix/suffix is tolerated (`-v color`).
+THREADTIME_RE = re.compile(
+    r"(?:\x1b\[[\d;]*m)?"
+    r"(\d\d-\d\d) (\d\d:\d\d:\d\d\.\d+) +(\d+) +(\d+) ([VDIWEFA]) (.*?) *: ?(.*?)"
+    r"(?:\x1b\[0m)?$"
+)
+
+# `line` is the raw text line (None for binary entries), `ts` the exact epoch
+# time and `uid` the sender uid, both only known for binary entries.
+LogEntry = namedtuple("LogEntry", "date time pid tid level tag message line ts uid", defaults=(None, None, None))
+
+
+def parse_line(line, _match=THREADTIME_RE.match):
+    """Parses one threadtime line. Returns a LogEntry or None."""
+    m = _match(line.rstrip("\r\n"))
+    if m is None:
+        return None
+    date, time, pid, tid, level, tag, message = m.groups()
+    return LogEntry(date, time, int(pid), int(tid), level, tag, message, line)
+
+
+# ActivityManager process lifecycle messages.
+# API 23: "Start proc 1234:com.example/u0a55 for activity ..."
+# Older:  "Start proc com.example for activity ...: pid=1234 uid=..."
+START_PROC_RE = re.compile(r"Start proc (?:(\d+):([\w.]+)/\S+ for|([\w.]+) for .*?: pid=(\d+))")
+# "Process com.example (pid 1234) has died"
+PROC_DIED_RE = re.compile(r"Process ([\w.:]+) \(pid (\d+)\) has died")
+
+
+def parse_lifecycle(message):
+    """Returns ("start"|"died", process_name, pid) for an ActivityManager message, else None."""
+    match = START_PROC_RE.search(message)
+    if match:
+        if match.group(1):
+            return "start", match.group(2), int(match.group(1))
+        return "start", match.group(3), int(match.group(4))
+    match = PROC_DIED_RE.search(message)
+    if match:
+        return "died", match.group(1), int(match.group(2))
+    return None
+
+
+_last_second = [((None, None), None)]
+
+
+def _second_start(date, clock, now):
+    # Consecutive lines mostly share the same second: parse it once
+    key = (date, clock)
+    last_key, last_ts = _last_second[0]
+    if last_key == key:
+        return last_ts
+    year = time.localtime(now).tm_year
+    ts = time.mktime(time.strptime(f"{year}-{date} {clock}", "%Y-%m-%d %H:%M:%S"))
+    if ts > now + 86400:
+        ts = time.mktime(time.strptime(f"{year - 1}-{date} {clock}", "%Y-%m-%d %H:%M:%S"))
+    _last_second[0] = (key, ts)
+    return ts
+
+
+def entry_timestamp(entry, now=None):
+    """Epoch seconds for an entry. Text lines carry no year: assume the latest
+    one that does not put the entry in the future."""
+    if entry.ts is not None:
+        return entry.ts
+    clock, _, frac = entry.time.partition(".")
+    return _second_start(entry.date, clock, now or time.time()) + (int(frac) / 10 ** len(frac) if frac else 0.0)
+
+
+class DeviceClock:
+    """Maps entry_timestamp() values onto the host clock.
+
+    Text entries carry the device's local wall time, which entry_timestamp()
+    reads as if it were in the host's timezone; binary entries carry real epoch
+    seconds. Each kind gets its own offset, measured from one `date` call that
+    prints the device time in both forms, so a device in another timezone is
+    not shifted by hours.
+    """
+
+    # Text date/time as in threadtime, epoch seconds, nanoseconds (%N is missing on some toolboxes)
+    COMMAND = "date '+%m-%d %H:%M:%S %s %N'"
+
+    def __init__(self, text_offset=0.0, epoch_offset=0.0):
+        self.text_offset = text_offset
+        self.epoch_offset = epoch_offset
+
+    @classmethod
+    def from_output(cls, out, before, after):
+        """Offsets from COMMAND's output, run between host times before and after.
+        Returns zero offsets if the output cannot be parsed."""
+        fields = out.split()
+        try:
+            date, clock, epoch = fields[0], fields[1], int(fields[2])
+            frac = int(fields[3]) / 1e9 if len(fields) > 3 and fields[3].isdigit() else 0.0
+            host_now = (before + after) / 2
+            text_now = _second_start(date, clock, host_now) + frac
+        except (IndexError, ValueError):
+            return cls()
+        return cls(host_now - text_now, host_now - (epoch + frac))
+
+    def host_time(self, entry):
+        """Host epoch time at which the device stamped entry."""
+        return entry_timestamp(entry) + (self.epoch_offset if entry.ts is not None else self.text_offset)
+
+
+# --- Binary (`logcat -B`) decoding ---
+
+# Android priority values -> letters (0/1 are unused/default)
+PRIORITY_LETTERS = "??VDIWEF"
+
+# logger_entry: u16 len, u16 hdr_size, i32 pid, i32 tid, i32 sec, i32 nsec,
+# then (v3) u32 lid, (v4) u32 uid. v1 has hdr_size == 0 and a 20 byte header.
+_ENTRY_HEAD = struct.Struct("<HHiiii")
+_U32 = struct.Struct("<I")
+LOGGER_ENTRY_V1_SIZE = 20
+LOGGER_ENTRY_V4_SIZE = 28
+
+
+class BinaryLogDecoder:
+    """Incrementally decodes `logcat -B` bytes into LogEntry tuples.
+
+    Partial entries stay in one reusable buffer until the next feed().
+    Must be read through `exec:` - the legacy pty `shell:` mangles binary data.
+    """
+
+    def __init__(self):
+        self._pending = bytearray()
+        self._last_sec = None
+        self._last_stamp = None
+
+    def _stamp(self, sec):
+        # Most consecutive entries share the same second: format it once
+        if sec != self._last_sec:
+            self._last_sec = sec
+            self._last_stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(sec)).split(" ")
+        return self._last_stamp
+
+    def feed(self, data):
+        """Adds bytes and returns the list of entries completed by them."""
+        buf = self._pending
+        buf += data
+        entries = []
+        offset = 0
+        end = len(buf)
+        unpack_head = _ENTRY_HEAD.unpack_from
+        while end - offset >= LOGGER_ENTRY_V1_SIZE:
+            length, hdr_size, pid, tid, sec, nsec = unpack_head(buf, offset)
+            if hdr_size == 0:
+                hdr_size = LOGGER_ENTRY_V1_SIZE
+            total = hdr_size + length
+            if end - offset < total:
+                break
+            uid = _U32.unpack_from(buf, offset + 24)[0] if hdr_size >= LOGGER_ENTRY_V4_SIZE else None
+
+            start = offset + hdr_size
+            offset += total
+            payload = bytes(buf[start:start + length])
+            if length < 2:
+                continue
+            priority = payload[0]
+            tag_end = payload.find(b"\0", 1)
+            if tag_end == -1:
+                tag_end = length
+            msg_end = payload.find(b"\0", tag_end + 1)
+            if msg_end == -1:
+                msg_end = length
+            tag = payload[1:tag_end].decode("utf-8", errors="replace")
+            message = payload[tag_end + 1:msg_end].decode("utf-8", errors="replace").rstrip("\n")
+            level = PRIORITY_LETTERS[priority] if priority < len(PRIORITY_LETTERS) else "F"
+            if level == "?":
+                level = "V"
+
+            date, clock = self._stamp(sec)
+            entries.append(LogEntry(date, f"{clock}.{nsec // 1000000:03d}", pid, tid, level, tag, message,
+                                    None, sec + nsec / 1e9, uid))
+        del buf[:offset]
+        return entries
+
+
+def read_chunks(conn, chunk_size=65536):
+    """Yields raw chunks of a connection, all backed by one reused buffer."""
+    view = memoryview(bytearray(chunk_size))
+    sock = conn.sock
+    while True:
+        n = sock.recv_into(view)
+        if not n:
+            return
+        yield view[:n]
+
+
+def read_binary_stream(conn, decoder=None):
+    """Yields entries from an `exec:logcat -B` connection until it closes."""
+    decoder = decoder or BinaryLogDecoder()
+    for chunk in read_chunks(conn):
+        yield from decoder.feed(chunk)
+
+
+# --- Host-side formatting ---
+
+# Same palette as `logcat -v color`
+LEVEL_COLORS = {
+    "V": "", "D": "\033[38;5;75m", "I": "\033[38;5;40m",
+    "W": "\033[38;5;166m", "E": "\033[38;5;196m", "F": "\033[38;5;196m", "A": "\033[38;5;196m",
+}
+COLOR_RESET = "\033[0m"
+
+
+def format_entry(entry, color=True):
+    """Renders an entry like `-v threadtime`; multi-line messages get one header per line."""
+    if entry.line is not None:
+        return entry.line
+    prefix = f"{entry.date} {entry.time} {entry.pid:5d} {entry.tid:5d} {entry.level} {entry.tag:<8}: "
+    start = LEVEL_COLORS.get(entry.level, "") if color else ""
+    end = COLOR_RESET if start else ""
+    return "".join(f"{start}{prefix}{text}{end}\n" for text in entry.message.split("\n"))
+
+
+# --- Filter predicates ---
+# Each returns a callable taking a LogEntry and returning a bool.
+
+def level_at_least(level):
+    """Matches entries with priority >= level (e.g. "W" keeps W, E, F)."""
+    minimum = LEVEL_RANK[level.upper()[0]]
+    ranks = LEVEL_RANK
+    return lambda e: ranks[e.level] >= minimum
+
+
+def tag_in(tags):
+    tags = frozenset(tags)
+    return lambda e: e.tag in tags
+
+
+def pid_in(pids):
+    """`pids` may be a mutable set; changes are seen by the filter."""
+    return lambda e: e.pid in pids
+
+
+def message_contains(text):
+    return lambda e: text in e.message
+
+
+def all_of(*predicates):
+    predicates = [p for p in predicates if p is not None]
+    if not predicates:
+        return lambda e: True
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda e: all(p(e) for p in predicates)
+
+
+def any_of(*predicates):
+    predicates = [p for p in predicates if p is not None]
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda e: any(p(e) for p in predicates)
+
+
+def parse_tag_list(values):
+    """Flattens repeated/comma separated --tag arguments."""
+    tags = set()
+    for value in values or []:
+        tags.update(t.strip() for t in value.split(",") if t.strip())
+    return tags
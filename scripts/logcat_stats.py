@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Throughput and latency instrumentation for the logcat pipeline.
+
+Counts lines read/matched/written, time spent per stage (read, parse, filter,
+write), queue depths and the lag between each entry's device timestamp and
+the moment it reached the terminal. A reporter thread prints a periodic
+status line and can export the same snapshot as JSON, to tell whether the
+device or the host tool is what makes logs show up late.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+STAGES = ("read", "parse", "filter", "write")
+
+
+class PipelineStats:
+    def __init__(self):
+        # Cumulative totals, only ever increased; rates come from deltas between snapshots
+        self.read = 0
+        self.matched = 0
+        self.written = 0
+        self.stage_time = dict.fromkeys(STAGES, 0.0)
+        self._lag_lock = threading.Lock()
+        self._lag_sum = 0.0
+        self._lag_count = 0
+        self._lag_max = 0.0
+        self._lag_last = None
+        self._prev = None
+        self.started = time.monotonic()
+
+    def add_time(self, stage, seconds):
+        self.stage_time[stage] += seconds
+
+    def on_written(self, timestamps, seconds):
+        """Writer callback: host-clock times the lines were logged (see DeviceClock), and write duration."""
+        self.stage_time["write"] += seconds
+        now = time.time()
+        with self._lag_lock:
+            for ts in timestamps:
+                if ts is None:
+                    continue  # Not a log line (with stats on, every log line is stamped)
+                lag = now - ts
+                self._lag_sum += lag
+                self._lag_count += 1
+                if lag > self._lag_max:
+                    self._lag_max = lag
+                self._lag_last = lag
+                self.written += 1
+
+    def snapshot(self, queue_depths=None):
+        """Rates and lag since the previous snapshot."""
+        now = time.monotonic()
+        totals = {"read": self.read, "matched": self.matched, "written": self.written,
+                  "stage_time": dict(self.stage_time)}
+        with self._lag_lock:
+            lag_count, lag_sum, lag_max, lag_last = self._lag_count, self._lag_sum, self._lag_max, self._lag_last
+            self._lag_count, self._lag_sum, self._lag_max = 0, 0.0, 0.0
+        prev = self._prev or {"at": self.started, "read": 0, "matched": 0, "written": 0,
+                              "stage_time": dict.fromkeys(STAGES, 0.0)}
+        self._prev = dict(totals, at=now)
+        elapsed = max(now - prev["at"], 1e-6)
+
+        read = totals["read"] - prev["read"]
+        matched = totals["matched"] - prev["matched"]
+        return {
+            "time": time.time(),
+            "interval": elapsed,
+            "lines_read_per_sec": read / elapsed,
+            "lines_matched_per_sec": matched / elapsed,
+            "lines_written_per_sec": (totals["written"] - prev["written"]) / elapsed,
+            "filter_ratio": matched / read if read else 0.0,
+            # Seconds spent per second of wall time; ~1.0 means that stage saturates a core
+            "stage_load": {stage: (totals["stage_time"][stage] - prev["stage_time"][stage]) / elapsed
+                           for stage in STAGES},
+            "lag_avg": lag_sum / lag_count if lag_count else None,
+            "lag_max": lag_max if lag_count else None,
+            "lag_last": lag_last,
+            "queue_depths": queue_depths or {},
+            "totals": {"read": totals["read"], "matched": totals["matched"], "written": totals["written"]},
+        }
+
+
+def format_status(snap):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.0f}ms"
+    load = snap["stage_load"]
+    # "read" includes idle time waiting for the device, the other stages are busy time
+    stages = " ".join(f"{'read(wait)' if stage == 'read' else stage} {load[stage] * 100:.0f}%" for stage in STAGES)
+    queues = " ".join(f"{name} {depth}" for name, depth in snap["queue_depths"].items())
+    return (f"\033[96m[stats] read {snap['lines_read_per_sec']:.0f}/s matched {snap['lines_matched_per_sec']:.0f}/s "
+            f"({snap['filter_ratio'] * 100:.1f}%) | lag avg {ms(snap['lag_avg'])} max {ms(snap['lag_max'])} "
+            f"| time {stages} | queue {queues or '-'}\033[0m")
+
+
+def write_json(path, data):
+    """Atomic replace, so readers never see a half-written file."""
+    dir_name = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('w', dir=dir_name, delete=False) as tf:
+        json.dump(data, tf, indent=2)
+        temp_name = tf.name
+    os.replace(temp_name, path)
+
+
+class StatsReporter(threading.Thread):
+    """Passes a status line to `emit` (and writes a JSON snapshot) every `interval` seconds."""
+
+    def __init__(self, stats, emit, queue_depths=None, interval=5.0, json_path=None, show=True):
+        super().__init__(daemon=True)
+        self.stats = stats
+        self.emit = emit
+        self.queue_depths = queue_depths or (lambda: {})
+        self.interval = interval
+        self.json_path = json_path
+        self.show = show
+        self._stop_event = threading.Event()
+
+    def report(self):
+        snap = self.stats.snapshot(self.queue_depths())
+        if self.show:
+            self.emit(format_status(snap))
+        if self.json_path:
+            try:
+                write_json(self.json_path, snap)
+            except OSError:
+                pass
+        return snap
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def timed_iter(iterable, stats, stage):
+    """Yields items of iterable, charging the time to produce each one to `stage`."""
+    it = iter(iterable)
+    clock = time.perf_counter
+    add = stats.add_time
+    while True:
+        start = clock()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        add(stage, clock() - start)
+        yield item
+
+
+def timed_map(func, iterable, stats, stage):
+    """Like map(), charging the time spent in func to `stage`."""
+    clock = time.perf_counter
+    add = stats.add_time
+    for item in iterable:
+        start = clock()
+        result = func(item)
+        add(stage, clock() - start)
+        yield result
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Batched, backpressure-aware terminal writer for log floods.
+
+The reader hands formatted text to write(), which never blocks: entries go
+into a bounded queue and a writer thread coalesces them into large writes on
+a time/size budget. When the terminal cannot keep up, low priority levels are
+first sampled and then dropped, and the exact number of dropped lines per
+level is reported inline where the gap happened.
+"""
+import collections
+import sys
+import threading
+import time
+
+# Levels that may be sampled/dropped under pressure
+LOW_PRIORITY = frozenset("VDI")
+# Queued in place of a timestamp for status lines, which are not log lines
+_CONTROL = object()
+
+
+class BatchedWriter:
+    def __init__(self, stream=None, max_queue=20000, max_batch_bytes=64 * 1024, max_delay=0.05,
+                 sample_every=10):
+        self.stream = stream or sys.stdout
+        self.max_queue = max_queue
+        # Above this, low priority lines are sampled (1 of sample_every kept)
+        self.high_water = max_queue * 3 // 4
+        # W/E/F may use some headroom past max_queue before being dropped too
+        self.hard_limit = max_queue + max_queue // 10
+        self.max_batch_bytes = max_batch_bytes
+        self.max_delay = max_delay
+        self.sample_every = sample_every
+
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sample_counter = 0
+        self.dropped = collections.Counter()  # level -> lines dropped (total)
+        self._reported = collections.Counter()
+        self.written = 0  # Log lines only, not status lines
+        self.batches = 0
+        # Optional callback(timestamps of the log lines, seconds) after each write (see logcat_stats)
+        self.on_written = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def qsize(self):
+        return len(self._items)
+
+    def write(self, text, level="I", ts=None):
+        """Queues text for output. `ts` is the entry's device time, for lag stats.
+        Returns False if it was dropped."""
+        with self._cond:
+            depth = len(self._items)
+            if depth >= self.high_water:
+                if level in LOW_PRIORITY:
+                    self._sample_counter += 1
+                    if depth >= self.max_queue or self._sample_counter % self.sample_every:
+                        self.dropped[level] += 1
+                        return False
+                elif depth >= self.hard_limit:
+                    self.dropped[level] += 1
+                    return False
+            self._items.append((text, ts))
+            if depth == 0:
+                self._cond.notify()
+        return True
+
+    def write_control(self, text):
+        """Status lines (app started, device lost...) are never dropped."""
+        with self._cond:
+            self._items.append((text, _CONTROL))
+            self._cond.notify()
+
+    def _drop_report(self):
+        # Called with the lock held
+        delta = self.dropped - self._reported
+        if not delta:
+            return None
+        self._reported.update(delta)
+        detail = ", ".join(f"{level}: {count}" for level, count in sorted(delta.items()))
+        return f"\033[93m>>> Terminal too slow: dropped {sum(delta.values())} lines ({detail}) <<<\033[0m\n"
+
+    def _take_batch(self):
+        """Waits for output and returns the next coalesced chunk (None when closed and empty)."""
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if not self._items and self._closed:
+                report = self._drop_report()
+                return ([report], []) if report else None
+            # Give the reader a moment to fill the batch, unless it is already big
+            if not self._closed and len(self._items) < 256:
+                self._cond.wait(self.max_delay)
+            batch = []
+            stamps = []
+            size = 0
+            report = self._drop_report()
+            if report:
+                batch.append(report)
+            items = self._items
+            while items and size < self.max_batch_bytes:
+                text, ts = items.popleft()
+                batch.append(text)
+                if ts is not _CONTROL:
+                    stamps.append(ts)
+                size += len(text)
+            return batch, stamps
+
+    def _run(self):
+        while True:
+            taken = self._take_batch()
+            if taken is None:
+                return
+            batch, stamps = taken
+            start = time.perf_counter()
+            try:
+                self.stream.write("".join(batch))
+                self.stream.flush()
+            except (BrokenPipeError, ValueError):
+                return
+            self.written += len(stamps)
+            self.batches += 1
+            if self.on_written:
+                self.on_written(stamps, time.perf_counter() - start)
+
+    def close(self, timeout=5):
+        """Flushes what is queued and stops the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        return sum(self.dropped.values())
@@ -1,18 +1,37 @@
 #!/usr/bin/env python3
-import subprocess
 import threading
 import time
 import sys
 import signal
 import os
 import re
+import argparse
+import queue
+from itertools import chain
+
+from adb_client import AdbError, get_client, quote
+from device_registry import get_registry
+from logcat_archive import LogArchive
+from logcat_writer import BatchedWriter
+from logcat_stats import PipelineStats, StatsReporter, timed_iter, timed_map
+from logcat_parser import (LEVELS, BinaryLogDecoder, DeviceClock, all_of, any_of, format_entry, level_at_least,
+                           message_contains, parse_lifecycle, parse_line, parse_tag_list, pid_in, read_binary_stream,
+                           read_chunks, tag_in)
 
 # Configuration
-ADB_PATH = "/home/linda/Android/Sdk/platform-tools/adb"
 PACKAGE = ""
 DEVICE_SERIAL = ""
 CURRENT_PID = None
+# Same PID as a set, so the filter can test membership on the int field
+APP_PIDS = set()
+PID_LOCK = threading.Lock()
 STOP_EVENT = threading.Event()
+# Output stage; status lines go through it too so they stay in order with the logs
+WRITER = None
+
+# Fallback PID polling: backs off while the log stream keeps us up to date
+POLL_MIN = 1.0
+POLL_MAX = 30.0
 
 # Colors for terminal output
 class Colors:
@@ -26,6 +45,13 @@ class Colors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+def announce(text):
+    """Prints a status line (never dropped)."""
+    if WRITER:
+        WRITER.write_control(text + "\n")
+    else:
+        print(text, flush=True)
+
 def load_active_config():
     """Loads configuration from .active_config file in the same directory."""
     script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -45,72 +71,290 @@ def load_active_config():
 def find_device():
     """Detects the most likely target device."""
     try:
-        cmd = [ADB_PATH, "devices"]
-        res = subprocess.run(cmd, capture_output=True, text=True)
-        lines = res.stdout.strip().split('\n')[1:] # Skip header
-        
-        devices = []
-        for line in lines:
-            if "\tdevice" in line:
-                devices.append(line.split('\t')[0])
-        
-        if not devices:
-            return None
-            
-        # Priority 1: Emulator-5554 (Default Pepper Emulator)
-        if "emulator-5554" in devices:
-            return "emulator-5554"
-            
-        # Priority 2: Localhost:5555 (Alternative connection)
-        if "localhost:5555" in devices:
-            return "localhost:5555"
-            
-        # Priority 3: First available device
-        return devices[0]
+        # emulator-5554 first, then localhost:5555, then the first available device
+        return get_registry().preferred()
     except:
         return None
 
+def on_device_change(serial, old_state, new_state):
+    """Reports connect/disconnect of the monitored device as it happens."""
+    if serial != DEVICE_SERIAL:
+        return
+    if new_state == "device":
+        announce(f"{Colors.GREEN}>>> Device Connected: {serial} <<<{Colors.ENDC}")
+    elif old_state == "device":
+        announce(f"{Colors.WARNING}>>> Device Disconnected: {serial} ({new_state or 'gone'}) <<<{Colors.ENDC}")
+
 def get_pid():
-    """Gets the PID of the package on the device."""
+    """Gets the PID of the package on the device, None if it is not running.
+    Raises AdbError/OSError/ValueError if the query itself failed."""
     if not DEVICE_SERIAL:
         return None
         
+    # pidof returns PIDs separated by space. We take the last one (newest).
+    out = get_client().shell(DEVICE_SERIAL, f"pidof {quote(PACKAGE)}", timeout=5)
+    pids = out.strip().split()
+    return int(pids[-1]) if pids else None
+
+def measure_device_clock():
+    """DeviceClock for lag stats. Sub-second only if the device `date` supports %N;
+    otherwise lag figures can be off by up to a second."""
     try:
-        # pidof returns PIDs separated by space. We take the last one (newest).
-        cmd = [ADB_PATH, "-s", DEVICE_SERIAL, "shell", "pidof", PACKAGE]
-        res = subprocess.run(cmd, capture_output=True, text=True)
-        pids = res.stdout.strip().split()
-        return pids[-1] if pids else None
-    except:
-        return None
+        before = time.time()
+        out = get_client().shell(DEVICE_SERIAL, DeviceClock.COMMAND, timeout=5)
+        return DeviceClock.from_output(out, before, time.time())
+    except (AdbError, OSError):
+        return DeviceClock()
 
-def monitor_pid():
-    """Background thread to monitor PID changes."""
+def set_pid(new_pid, expected=None):
+    """Switches the tracked PID. Returns True if it changed.
+
+    When `expected` is given, only switch if the current PID still matches it
+    (used for "has died" lines, which may refer to an older process).
+    """
     global CURRENT_PID
-    
+
+    with PID_LOCK:
+        old_pid = CURRENT_PID
+        if new_pid == old_pid or (expected is not None and old_pid != expected):
+            return False
+        CURRENT_PID = new_pid
+        # Add before discard so the filter never sees an empty set mid-switch
+        if new_pid:
+            APP_PIDS.add(new_pid)
+        APP_PIDS.discard(old_pid)
+
+    if new_pid:
+        if old_pid is None:
+            announce(f"{Colors.GREEN}>>> App Started: {PACKAGE} (PID: {new_pid}) <<<{Colors.ENDC}")
+        else:
+            announce(f"{Colors.CYAN}>>> App Restarted: {PACKAGE} (PID: {new_pid}) <<<{Colors.ENDC}")
+    else:
+        announce(f"{Colors.WARNING}>>> App Closed: {PACKAGE} <<<{Colors.ENDC}")
+    return True
+
+def track_lifecycle(message):
+    """Updates CURRENT_PID from ActivityManager start/death messages."""
+    event = parse_lifecycle(message)
+    if event is None or event[1] != PACKAGE:
+        return
+    kind, _, pid = event
+    if kind == "start":
+        set_pid(pid)
+    else:
+        set_pid(None, expected=pid)
+
+def build_filter(level=None, tags=None):
+    """Lines from the app's PID or mentioning the package, narrowed by level/tag."""
+    app = any_of(pid_in(APP_PIDS), message_contains(PACKAGE))
+    return all_of(
+        app,
+        level_at_least(level) if level else None,
+        tag_in(tags) if tags else None,
+    )
+
+def monitor_pid():
+    """Fallback PID poller, in case lifecycle lines are missed (e.g. buffer overrun)."""
+    interval = POLL_MIN
+
     while not STOP_EVENT.is_set():
-        new_pid = get_pid()
-        if new_pid != CURRENT_PID:
-            if new_pid:
-                if CURRENT_PID is None:
-                    print(f"{Colors.GREEN}>>> App Started: {PACKAGE} (PID: {new_pid}) <<<{Colors.ENDC}")
-                else:
-                    print(f"{Colors.CYAN}>>> App Restarted: {PACKAGE} (PID: {new_pid}) <<<{Colors.ENDC}")
-            else:
-                if CURRENT_PID is not None:
-                    print(f"{Colors.WARNING}>>> App Closed: {PACKAGE} <<<{Colors.ENDC}")
-            CURRENT_PID = new_pid
-        time.sleep(1)
+        try:
+            pid = get_pid()
+        except (AdbError, OSError, ValueError):
+            # A failed query (e.g. a timeout over Wi-Fi) says nothing: keep the PID from the log stream
+            changed = False
+        else:
+            changed = set_pid(pid)
+        if changed:
+            # The log stream missed a change: poll eagerly again for a while
+            interval = POLL_MIN
+        else:
+            interval = min(interval * 2, POLL_MAX)
+        STOP_EVENT.wait(interval)
+
+def get_app_uid(serial):
+    """Reads the app's uid on serial from `dumpsys package` (needed for logcat --uid)."""
+    try:
+        out = get_client().shell(serial, f"dumpsys package {quote(PACKAGE)}", timeout=10)
+    except (AdbError, OSError):
+        return None
+    match = re.search(r"userId=(\d+)", out)
+    return int(match.group(1)) if match else None
+
+def filter_specs(level=None, tags=None):
+    """Device-side TAG:LEVEL filterspecs equivalent to --level/--tag."""
+    level = level or "V"
+    if tags:
+        return [f"{tag}:{level}" for tag in sorted(tags)] + ["*:S"]
+    if level != "V":
+        return [f"*:{level}"]
+    return []
+
+def logcat_format_args(binary=False):
+    # Binary entries are colored on the host; text comes colored from the device
+    return ["-B"] if binary else ["-v", "color", "-v", "threadtime"]
+
+def open_logcat(serial, logcat_args, binary=False):
+    """Opens a logcat stream through the adb server.
+
+    Binary output must go through `exec:`; the pty behind `shell:` on API 23
+    rewrites LF as CRLF.
+    """
+    cmd = "logcat " + " ".join(quote(a) for a in logcat_format_args(binary) + logcat_args)
+    if binary:
+        return get_client().open_exec(serial, cmd)
+    return get_client().open_shell(serial, cmd)
+
+def parse_raw_line(raw):
+    """Parses one line of bytes from a text stream (CRLF from the API 23 pty included)."""
+    return parse_line(raw.decode('utf-8', errors='replace').rstrip('\r\n') + '\n')
+
+def read_entries(conn, binary=False):
+    """Yields parsed LogEntry tuples from an open logcat stream."""
+    if binary:
+        yield from read_binary_stream(conn)
+        return
+    for raw in conn.makefile('rb'):
+        entry = parse_raw_line(raw)
+        if entry is not None:
+            yield entry
+
+class LogStream(threading.Thread):
+    """One device logcat stream read through the adb server into a queue of entries."""
+
+    def __init__(self, serial, logcat_args, out_queue, binary=False):
+        super().__init__(daemon=True)
+        self.serial = serial
+        self.logcat_args = logcat_args
+        self.binary = binary
+        self.out_queue = out_queue
+        self.conn = None
+        self.closed = False
+
+    def run(self):
+        try:
+            self.conn = open_logcat(self.serial, self.logcat_args, self.binary)
+            if self.closed:
+                self.conn.close()
+                return
+            for entry in read_entries(self.conn, self.binary):
+                self.out_queue.put(entry)
+        except (AdbError, OSError, ValueError):
+            pass
+        # A stream we did not close ourselves means the device went away
+        if not self.closed:
+            self.out_queue.put(None)
+
+    def close(self):
+        self.closed = True
+        if self.conn:
+            self.conn.close()
+
+class DeviceLogSource:
+    """Pushes filtering to the device to cut USB/Wi-Fi transfer volume.
+
+    Modes, picked from what the device's logcat supports:
+      uid  - `--uid=<app uid>`: survives app restarts, no PID tracking needed
+      pid  - `--pid=<pid>`: restarted on every PID change; a small
+             ActivityManager-only stream keeps lifecycle tracking alive
+      host - old images (Pepper's API 23): only TAG:LEVEL filterspecs are
+             applied on the device, PID filtering stays on the host
+    """
+
+    def __init__(self, serial, level=None, tags=None, binary=False):
+        self.serial = serial
+        self.binary = binary
+        self.specs = filter_specs(level, tags)
+        self.queue = queue.Queue(maxsize=10000)
+        self.streams = []
+        self.app_stream = None
+        self.stream_pid = None
+        self.uid = None
+        self.mode = self._detect_mode()
+
+    def _detect_mode(self):
+        try:
+            usage = get_client().shell(self.serial, "logcat --help 2>&1", timeout=5)
+        except (AdbError, OSError):
+            usage = ""
+        if "--uid" in usage:
+            self.uid = get_app_uid(self.serial)
+            if self.uid is not None:
+                return "uid"
+        if "--pid" in usage:
+            return "pid"
+        return "host"
+
+    def _open(self, logcat_args):
+        stream = LogStream(self.serial, logcat_args, self.queue, self.binary)
+        stream.start()
+        self.streams.append(stream)
+        return stream
+
+    def start(self):
+        if self.mode == "uid":
+            self._open([f"--uid={self.uid}"] + self.specs)
+        elif self.mode == "pid":
+            self._open(["-T", "1", "ActivityManager:I", "*:S"])
+        else:
+            # Keep ActivityManager lines flowing for lifecycle tracking
+            specs = ["ActivityManager:I"] + self.specs if self.specs else []
+            self._open(specs)
+        return self
+
+    def _restart_app_stream(self):
+        if self.app_stream:
+            self.app_stream.close()
+            self.streams.remove(self.app_stream)
+            self.app_stream = None
+        self.stream_pid = CURRENT_PID
+        if self.stream_pid:
+            self.app_stream = self._open([f"--pid={self.stream_pid}"] + self.specs)
+
+    def host_filter(self, level=None, tags=None):
+        if self.mode == "uid":
+            # Already narrowed to the app on the device; new PIDs show up before we learn them
+            return all_of(level_at_least(level) if level else None, tag_in(tags) if tags else None)
+        return build_filter(level, tags)
+
+    def entries(self):
+        while not STOP_EVENT.is_set():
+            if self.mode == "pid" and CURRENT_PID != self.stream_pid:
+                self._restart_app_stream()
+            try:
+                entry = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if entry is None:
+                break
+            yield entry
+
+    def close(self):
+        for stream in self.streams:
+            stream.close()
 
 def main():
-    global PACKAGE, DEVICE_SERIAL
+    global PACKAGE, DEVICE_SERIAL, WRITER
     
+    parser = argparse.ArgumentParser(description='Filtered logcat for one app')
+    parser.add_argument('package', nargs='?', help='Package name (default: PEPPER_PACKAGE from .active_config)')
+    parser.add_argument('device_serial', nargs='?', help='Device serial (default: auto-detect)')
+    parser.add_argument('--level', choices=list(LEVELS), type=str.upper, help='Minimum priority to show (e.g. W)')
+    parser.add_argument('--tag', action='append', help='Only show these tags (repeatable or comma separated)')
+    parser.add_argument('--device-filter', action='store_true', help='Filter on the device (--pid/--uid/TAG:LEVEL) to cut transfer volume')
+    parser.add_argument('--binary', action='store_true', help='Read binary logcat (-B) and color on the host')
+    parser.add_argument('--archive', action='store_true', help='Also store every entry read in the on-disk archive (see logcat_archive.py)')
+    parser.add_argument('--stats', action='store_true', help='Print a periodic throughput/lag status line')
+    parser.add_argument('--stats-interval', type=float, default=5.0, help='Seconds between stats reports (default: 5)')
+    parser.add_argument('--stats-json', metavar='PATH', help='Also export each stats snapshot as JSON to PATH')
+    args = parser.parse_args()
+
     # 1. Load Config
     config = load_active_config()
     
     # 2. Determine Package
-    if len(sys.argv) > 1:
-        PACKAGE = sys.argv[1]
+    if args.package:
+        PACKAGE = args.package
     elif "PEPPER_PACKAGE" in config:
         PACKAGE = config["PEPPER_PACKAGE"]
     else:
@@ -119,8 +363,8 @@ def main():
         sys.exit(1)
 
     # 3. Determine Device
-    if len(sys.argv) > 2:
-        DEVICE_SERIAL = sys.argv[2]
+    if args.device_serial:
+        DEVICE_SERIAL = args.device_serial
     else:
         print(f"{Colors.BLUE}Auto-detecting device...{Colors.ENDC}")
         DEVICE_SERIAL = find_device()
@@ -137,47 +381,111 @@ def main():
     # Plain text signal for problem matcher
     print(">>> MONITOR STARTED <<<", flush=True)
 
+    # Decouples reading from terminal rendering; sheds V/D/I lines if the terminal lags
+    WRITER = BatchedWriter()
+    get_registry().add_listener(on_device_change)
+
+    tags = parse_tag_list(args.tag)
+
     # Start PID monitor
     t = threading.Thread(target=monitor_pid, daemon=True)
     t.start()
     
-    # Start logcat process
-    # We use -v color for colored output, and -v threadtime for timestamps
-    process = subprocess.Popen(
-        [ADB_PATH, "-s", DEVICE_SERIAL, "logcat", "-v", "color", "-v", "threadtime"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        errors='replace',
-        bufsize=1
-    )
+    source = None
+    conn = None
+    archive = None
+    stats = None
+    if args.stats or args.stats_json:
+        stats = PipelineStats()
+        device_clock = measure_device_clock()
+        WRITER.on_written = stats.on_written
+    if args.archive:
+        archive = LogArchive(DEVICE_SERIAL)
+        print(f"{Colors.BLUE}Archiving to {archive.dir}{Colors.ENDC}", flush=True)
+    if args.device_filter:
+        source = DeviceLogSource(DEVICE_SERIAL, args.level, tags, args.binary).start()
+        print(f"{Colors.BLUE}Device-side filtering: {source.mode} mode{Colors.ENDC}", flush=True)
+        entries = source.entries()
+        if stats:
+            # Parsing happens in the stream threads here, so it is part of "read"
+            entries = timed_iter(entries, stats, "read")
+        line_filter = source.host_filter(args.level, tags)
+    elif args.binary:
+        conn = open_logcat(DEVICE_SERIAL, [], binary=True)
+        if stats:
+            decoder = BinaryLogDecoder()
+            chunks = timed_iter(read_chunks(conn), stats, "read")
+            entries = chain.from_iterable(timed_map(decoder.feed, chunks, stats, "parse"))
+        else:
+            entries = read_binary_stream(conn)
+        line_filter = build_filter(args.level, tags)
+    else:
+        # -v color for colored output, -v threadtime for timestamps
+        conn = open_logcat(DEVICE_SERIAL, [])
+        if stats:
+            raw_lines = timed_iter(conn.makefile('rb'), stats, "read")
+            # Buffer separators ("--------- beginning of main") and the like parse to None
+            entries = filter(None, timed_map(parse_raw_line, raw_lines, stats, "parse"))
+        else:
+            entries = read_entries(conn)
+        line_filter = build_filter(args.level, tags)
+
+    reporter = None
+    if stats:
+        def queue_depths():
+            depths = {"writer": WRITER.qsize() if WRITER else 0}
+            if source:
+                depths["source"] = source.queue.qsize()
+            return depths
+        reporter = StatsReporter(stats, announce, queue_depths, args.stats_interval,
+                                 args.stats_json, show=args.stats)
+        reporter.start()
+    clock = time.perf_counter
     
     try:
-        while True:
-            line = process.stdout.readline()
-            if not line:
-                break
-            
-            # Filter Logic
-            should_print = False
-            
-            if PACKAGE in line:
-                should_print = True
-            elif CURRENT_PID:
-                if f" {CURRENT_PID} " in line or f":{CURRENT_PID} " in line or f" {CURRENT_PID}:" in line:
-                    should_print = True
-            
-            if should_print:
-                print(line, end='')
+        for entry in entries:
+            if archive:
+                archive.append(entry)
+
+            if stats:
+                stats.read += 1
+                start = clock()
+
+            # PID changes take effect on the very line that announces them
+            if entry.tag == "ActivityManager":
+                track_lifecycle(entry.message)
+
+            if line_filter(entry):
+                if stats:
+                    stats.matched += 1
+                    WRITER.write(format_entry(entry), entry.level, device_clock.host_time(entry))
+                else:
+                    WRITER.write(format_entry(entry), entry.level)
+
+            if stats:
+                stats.add_time("filter", clock() - start)
             
     except KeyboardInterrupt:
-        print(f"\n{Colors.BLUE}Stopping monitor...{Colors.ENDC}")
+        announce(f"\n{Colors.BLUE}Stopping monitor...{Colors.ENDC}")
     except Exception as e:
-        print(f"\n{Colors.FAIL}Monitor Error: {e}{Colors.ENDC}")
+        announce(f"\n{Colors.FAIL}Monitor Error: {e}{Colors.ENDC}")
     finally:
         STOP_EVENT.set()
-        if process:
-            process.terminate()
+        if reporter:
+            reporter.stop()
+        dropped = WRITER.close()
+        WRITER = None
+        if reporter:
+            # Final snapshot once everything queued has reached the terminal
+            reporter.report()
+        if dropped:
+            print(f"{Colors.WARNING}Total lines dropped by the output stage: {dropped}{Colors.ENDC}")
+        if source:
+            source.close()
+        if conn:
+            conn.close()
+        if archive:
+            archive.close()
 
 if __name__ == "__main__":
     main()
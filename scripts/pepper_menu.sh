@@ -1,12 +1,10 @@
 #!/bin/bash
 while true; do
-    # Check connection status
-    ADB_OUTPUT=$(adb devices | grep -v "List" | grep "device$")
-    if [ -z "$ADB_OUTPUT" ]; then
+    # Check connection status (shared dedupe/priority rules from device_registry.py)
+    DEVICE=$(python3 ./scripts/device_registry.py --first 2>/dev/null)
+    if [ -z "$DEVICE" ]; then
         STATUS="Not Connected"
     else
-        # Get first device
-        DEVICE=$(echo "$ADB_OUTPUT" | head -n 1 | awk '{print $1}')
         STATUS="Connected to $DEVICE"
     fi
 
@@ -18,6 +16,7 @@ while true; do
     echo "2) Connect Physical Pepper (GUI)"
     echo "3) Setup Project"
     echo "4) Gradle Auto-Build"
+    echo "5) Build All Variants (Matrix)"
     echo "q) Quit"
     echo "=========================================="
     read -p "Select an option: " choice
@@ -37,6 +36,10 @@ while true; do
         4)
             ./gradlew assembleDebug --continuous
             ;;
+        5)
+            # resolve_project.sh returns from the sourcing shell, so keep it in a subshell
+            (source ./scripts/resolve_project.sh && python3 ./scripts/build_matrix.py "$PROJECT_DIR")
+            ;;
         q)
             echo "Exiting."
             exit 0
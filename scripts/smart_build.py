@@ -1,27 +1,32 @@
 #!/usr/bin/env python3
 import os
 import sys
-import re
+import signal
 import subprocess
 import glob
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from apk_install import file_md5, install_apk, start_activity
+from apk_manifest import read_manifest
+from build_cache import load_entries, save_entries
+from device_registry import get_registry
+from gradle_parser import assemble_task, find_gradle_file, flavor_name, parse_gradle
+
 # Configuration
-SDK_DIR = "/home/linda/Android/Sdk"
-# specific build tools version might be needed, but let's try to find the latest
-try:
-    BUILD_TOOLS_DIR = glob.glob(os.path.join(SDK_DIR, "build-tools", "*"))[-1]
-    AAPT = os.path.join(BUILD_TOOLS_DIR, "aapt")
-except IndexError:
-    AAPT = "aapt" # Hope it's in path
+# Last confirmed variant per project, pre-selected (and pre-built) on the next run
+LAST_CHOICE_NAME = "last_choice.json"
+LAST_CHOICE_VERSION = 1
+CANCEL_TIMEOUT = 15
 
 class BuildDialog:
-    def __init__(self, root, dimensions, flavors, devices, on_submit):
+    def __init__(self, root, dimensions, flavors, build_types, devices, on_submit, defaults=None):
         self.root = root
         self.root.title("Build Configuration")
         self.on_submit = on_submit
         self.result = None
+        defaults = defaults or {}
         
         # Style
         style = ttk.Style()
@@ -36,11 +41,11 @@ class BuildDialog:
         ttk.Label(main_frame, text="Build Type", font=('Helvetica', 12, 'bold')).grid(row=row, column=0, sticky="w", pady=(0, 5))
         row += 1
         
-        self.build_type_var = tk.StringVar(value="Debug")
+        self.build_type_var = tk.StringVar(value=defaults.get("build_type", build_types[0]))
         bt_frame = ttk.Frame(main_frame)
         bt_frame.grid(row=row, column=0, sticky="w", pady=(0, 15))
-        ttk.Radiobutton(bt_frame, text="Debug", variable=self.build_type_var, value="Debug").pack(side=tk.LEFT, padx=(0, 10))
-        ttk.Radiobutton(bt_frame, text="Release", variable=self.build_type_var, value="Release").pack(side=tk.LEFT)
+        for bt in build_types:
+            ttk.Radiobutton(bt_frame, text=bt[0].upper() + bt[1:], variable=self.build_type_var, value=bt).pack(side=tk.LEFT, padx=(0, 10))
         row += 1
 
         # --- Device ---
@@ -55,7 +60,8 @@ class BuildDialog:
             ttk.Label(dev_frame, text="No devices connected", foreground="red").pack(side=tk.LEFT)
             self.device_var.set(None)
         else:
-            self.device_var.set(devices[0]) # Default to first
+            # Default to the last used device, else the first
+            self.device_var.set(defaults.get("device") if defaults.get("device") in devices else devices[0])
             for dev in devices:
                 # Clean up serial for display if possible, but serial is needed for adb
                 ttk.Radiobutton(dev_frame, text=dev, variable=self.device_var, value=dev).pack(side=tk.LEFT, padx=(0, 10))
@@ -72,7 +78,7 @@ class BuildDialog:
             
             opts = flavors.get(dim, [])
             if opts:
-                var = tk.StringVar(value=opts[0])
+                var = tk.StringVar(value=defaults.get("flavors", {}).get(dim, opts[0]))
                 self.flavor_vars[dim] = var
                 for opt in opts:
                     ttk.Radiobutton(f_frame, text=opt, variable=var, value=opt).pack(side=tk.LEFT, padx=(0, 10))
@@ -110,78 +116,105 @@ class BuildDialog:
 
 def get_connected_devices():
     try:
-        out = subprocess.check_output(["adb", "devices"], text=True)
-        lines = out.strip().split('\n')[1:]
-        devices = [line.split()[0] for line in lines if "device" in line and "List" not in line]
-        # Dedupe emulator/localhost
-        if "emulator-5554" in devices and "localhost:5555" in devices:
-            devices.remove("localhost:5555")
-        return devices
+        # Deduped emulator/localhost list from the shared tracker
+        return get_registry().devices()
     except:
         return []
 
-def parse_gradle(gradle_path):
-    with open(gradle_path, 'r') as f:
-        content = f.read()
-    
-    # Extract dimensions
-    dims_match = re.search(r'flavorDimensions\s+(.*)', content)
-    dimensions = []
-    if dims_match:
-        raw = dims_match.group(1)
-        raw = re.sub(r'//.*', '', raw)
-        dimensions = [d.strip().strip('"\'') for d in raw.split(',')]
-
-    # Extract flavors
-    flavors = {} 
-    start_match = re.search(r'productFlavors\s*\{', content)
-    if start_match:
-        start_idx = start_match.end()
-        brace_count = 1
-        i = start_idx
-        while i < len(content) and brace_count > 0:
-            if content[i] == '{': brace_count += 1
-            elif content[i] == '}': brace_count -= 1
-            i += 1
-        
-        block_content = content[start_idx:i-1]
-        flavor_defs = re.finditer(r'(\w+)\s*\{', block_content)
-        
-        for match in flavor_defs:
-            name = match.group(1)
-            f_start = match.end()
-            f_brace = 1
-            j = f_start
-            while j < len(block_content) and f_brace > 0:
-                if block_content[j] == '{': f_brace += 1
-                elif block_content[j] == '}': f_brace -= 1
-                j += 1
-            
-            f_body = block_content[f_start:j-1]
-            dim_match = re.search(r'dimension\s+["\'](\w+)["\']', f_body)
-            if dim_match:
-                dim = dim_match.group(1)
-                if dim not in flavors: flavors[dim] = []
-                flavors[dim].append(name)
-    
-    return dimensions, flavors
+def default_choice(project_root, dimensions, flavors, build_types):
+    """The last confirmed choice for this project if still valid, else the first options."""
+    last = load_entries(LAST_CHOICE_NAME, LAST_CHOICE_VERSION).get(os.path.abspath(project_root), {})
+    last_flavors = last.get("flavors", {})
+    choice = {"build_type": last.get("build_type") if last.get("build_type") in build_types else build_types[0],
+              "device": last.get("device"), "flavors": {}}
+    for dim in dimensions:
+        opts = flavors.get(dim, [])
+        if opts:
+            choice["flavors"][dim] = last_flavors.get(dim) if last_flavors.get(dim) in opts else opts[0]
+    return choice
+
+def save_choice(project_root, choice):
+    choices = load_entries(LAST_CHOICE_NAME, LAST_CHOICE_VERSION)
+    choices[os.path.abspath(project_root)] = choice
+    save_entries(LAST_CHOICE_NAME, LAST_CHOICE_VERSION, choices)
+
+class SpeculativeBuild:
+    """A Gradle invocation started while the dialog is still open.
+
+    Output is held back until adopt(); cancel() stops the client, which makes the
+    daemon abandon the build, so it is free (and warm) for the real one.
+    """
+
+    def __init__(self, project_root, args):
+        self.args = args
+        self._lines = []
+        self._live = False
+        self._lock = threading.Lock()
+        self.proc = subprocess.Popen([os.path.join(project_root, "gradlew")] + args, cwd=project_root,
+                                     stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, text=True, bufsize=1)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            with self._lock:
+                if self._live:
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                else:
+                    self._lines.append(line)
+
+    def adopt(self):
+        """Prints the output so far, follows the rest and returns the exit code."""
+        with self._lock:
+            sys.stdout.writelines(self._lines)
+            sys.stdout.flush()
+            self._lines = []
+            self._live = True
+        returncode = self.proc.wait()
+        self._reader.join()
+        return returncode
+
+    def cancel(self):
+        if self.proc.poll() is None:
+            # Same as Ctrl+C in a terminal: the client asks the daemon to cancel
+            self.proc.send_signal(signal.SIGINT)
+            try:
+                self.proc.wait(timeout=CANCEL_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
 
 def main():
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--action', choices=['build', 'run'], default='build', help='Action to perform')
+    parser.add_argument('--no-prebuild', dest='prebuild', action='store_false',
+                        help='Only warm up the Gradle daemon while the dialog is open, do not pre-build the default variant')
     parser.add_argument('project_root', help='Project root directory')
     args = parser.parse_args()
 
     project_root = args.project_root
     app_dir = os.path.join(project_root, "app")
-    gradle_file = os.path.join(app_dir, "build.gradle")
+    gradle_file = find_gradle_file(app_dir)
 
-    if not os.path.exists(gradle_file):
-        print("Error: build.gradle not found")
+    if not gradle_file:
+        print("Error: build.gradle(.kts) not found")
         sys.exit(1)
 
-    dimensions, flavors = parse_gradle(gradle_file)
+    gradle = parse_gradle(gradle_file)
+    dimensions, flavors = gradle["dimensions"], gradle["flavors"]
+    defaults = default_choice(project_root, dimensions, flavors, gradle["build_types"])
+    default_task = assemble_task(dimensions, defaults["flavors"], defaults["build_type"])
+
+    # Start the daemon (and optionally the likely build) while the user is still choosing
+    try:
+        speculative = SpeculativeBuild(project_root, [default_task] if args.prebuild else ["-q", "help"])
+    except OSError as e:
+        print(f"Gradle warm-up skipped: {e}")
+        speculative = None
+
     devices = get_connected_devices()
 
     # Show GUI
@@ -192,26 +225,22 @@ def main():
         nonlocal config
         config = res
 
-    app = BuildDialog(root, dimensions, flavors, devices, on_submit)
-    root.mainloop()
+    app = BuildDialog(root, dimensions, flavors, gradle["build_types"], devices, on_submit, defaults)
+    try:
+        root.mainloop()
+    finally:
+        if not app.result and speculative:
+            speculative.cancel()
 
     if not app.result:
         print("Cancelled")
         sys.exit(1)
 
     res = app.result
-    
-    # Construct Task
-    # assemble[Flavor1][Flavor2][BuildType]
-    # Order of flavors must match dimensions order
-    flavor_part = ""
-    for dim in dimensions:
-        val = res['flavors'].get(dim, "")
-        if val:
-            flavor_part += val[0].upper() + val[1:]
-            
+    save_choice(project_root, res)
+
     build_type = res['build_type']
-    task = f"assemble{flavor_part}{build_type}"
+    task = assemble_task(dimensions, res['flavors'], build_type)
     
     print(f"Selected Task: {task}")
     print(f"Target Device: {res['device']}")
@@ -220,12 +249,21 @@ def main():
     gradlew = os.path.join(project_root, "gradlew")
     cmd = [gradlew, task]
     
-    print(f"Running: {' '.join(cmd)}")
-    try:
-        subprocess.run(cmd, cwd=project_root, check=True)
-    except subprocess.CalledProcessError:
-        print("Build Failed")
-        sys.exit(1)
+    if speculative and speculative.args == [task]:
+        print(f"Reusing pre-build: {' '.join(cmd)}")
+        if speculative.adopt() != 0:
+            print("Build Failed")
+            sys.exit(1)
+    else:
+        if speculative:
+            # Warm-up, or a pre-build of another variant: free the daemon for this build
+            speculative.cancel()
+        print(f"Running: {' '.join(cmd)}")
+        try:
+            subprocess.run(cmd, cwd=project_root, check=True)
+        except subprocess.CalledProcessError:
+            print("Build Failed")
+            sys.exit(1)
 
     if args.action == 'run':
         if not res['device']:
@@ -235,24 +273,16 @@ def main():
         # Find APK
         # Find APK in specific flavor folder
         # Folder structure: app/build/outputs/apk/{flavor1}{Flavor2}.../{buildType}/
-        folder_name = ""
-        for i, dim in enumerate(dimensions):
-            val = res['flavors'].get(dim, "")
-            if val:
-                if i == 0:
-                    folder_name += val
-                else:
-                    folder_name += val[0].upper() + val[1:]
+        folder_name = flavor_name(dimensions, res['flavors'])
         
-        bt_lower = build_type.lower()
-        apk_dir = os.path.join(app_dir, "build", "outputs", "apk", folder_name, bt_lower)
+        apk_dir = os.path.join(app_dir, "build", "outputs", "apk", folder_name, build_type)
         
         print(f"Looking for APK in: {apk_dir}")
         
         if not os.path.exists(apk_dir):
             # Fallback to recursive search if folder structure differs
             print("Specific folder not found, falling back to recursive search...")
-            suffix = "debug.apk" if build_type == "Debug" else "release.apk"
+            suffix = f"{build_type}.apk"
             apk_pattern = os.path.join(app_dir, "build", "outputs", "apk", "**", f"*-{suffix}")
             apks = glob.glob(apk_pattern, recursive=True)
         else:
@@ -269,19 +299,21 @@ def main():
         print(f"Installing: {latest_apk}")
         
         try:
-            subprocess.run(["adb", "-s", res['device'], "install", "-r", latest_apk], check=True)
-            
-            # Get Package Name
-            aapt_out = subprocess.check_output([AAPT, "dump", "badging", latest_apk], text=True)
-            pkg_match = re.search(r"package: name='([^']+)'", aapt_out)
-            if pkg_match:
-                pkg = pkg_match.group(1)
-                # Get Launchable Activity
-                act_match = re.search(r"launchable-activity: name='([^']+)'", aapt_out)
-                act = act_match.group(1) if act_match else f"{pkg}.MainActivity"
+            # Package name and launcher activity straight from the APK's manifest
+            md5 = file_md5(latest_apk)
+            manifest = read_manifest(latest_apk, md5)
+            pkg = manifest["package"]
+
+            installed = install_apk(res['device'], latest_apk, pkg, md5=md5)
+            if installed == "skipped":
+                print("APK unchanged on device, install skipped.")
+
+            if pkg:
+                act = manifest["launcher_activity"] or f"{pkg}.MainActivity"
                 
                 print(f"Launching: {pkg}/{act}")
-                subprocess.run(["adb", "-s", res['device'], "shell", "am", "start", "-n", f"{pkg}/{act}"], check=True)
+                # install -r used to kill the app; -S keeps that fresh start when the install is skipped
+                start_activity(res['device'], f"{pkg}/{act}")
                 
         except Exception as e:
             print(f"Install/Launch failed: {e}")
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Offline tests for adb_client against an in-process fake adb server.
+
+The fake speaks the same framing as the real server: hex4 smart-socket
+requests answered with OKAY/FAIL, `shell:` replies with pty-style CRLF,
+`exec:sh` backed by a local sh process, and the sync protocol over an
+in-memory file table.
+
+Run: python3 -m unittest test_adb_client   (or pytest) from scripts/
+"""
+import io
+import shutil
+import socket
+import stat as stat_mod
+import struct
+import subprocess
+import threading
+import unittest
+
+from adb_client import AdbClient, AdbError, parse_device_list
+
+SERIAL = "emulator-5554"
+
+
+class FakeAdbServer:
+    """Serves one device on 127.0.0.1 at a free port."""
+
+    def __init__(self):
+        self.files = {}  # path -> (mode, mtime, bytes)
+        self.dirs = {"/sdcard": 0o40771}
+        self.shell_replies = {}  # `shell:` command -> text (\n is sent as \r\n)
+        self.requests = []
+        self._shells = []
+        self._lock = threading.Lock()
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self._sock.close()
+        self.drop_shells()
+
+    def drop_shells(self):
+        """Breaks every open `exec:sh` stream, like a device disconnect."""
+        with self._lock:
+            shells, self._shells = self._shells, []
+        for conn, proc in shells:
+            proc.kill()
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _read(conn, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                raise EOFError
+            buf += chunk
+        return buf
+
+    @staticmethod
+    def _fail(conn, message):
+        data = message.encode()
+        conn.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def _handle(self, conn):
+        try:
+            while True:
+                service = self._read(conn, int(self._read(conn, 4), 16)).decode()
+                self.requests.append(service)
+                if service == "host:devices":
+                    payload = f"{SERIAL}\tdevice\n".encode()
+                    conn.sendall(b"OKAY" + b"%04x" % len(payload) + payload)
+                elif service == "host:version":
+                    conn.sendall(b"OKAY00040029")
+                elif service.startswith("host:transport"):
+                    if service not in ("host:transport-any", f"host:transport:{SERIAL}"):
+                        self._fail(conn, f"device '{service.rsplit(':', 1)[1]}' not found")
+                        break
+                    conn.sendall(b"OKAY")
+                    continue
+                elif service.startswith("shell:"):
+                    reply = self.shell_replies.get(service[len("shell:"):], "")
+                    conn.sendall(b"OKAY" + reply.replace("\n", "\r\n").encode())
+                elif service == "exec:sh":
+                    self._exec_sh(conn)
+                    return
+                elif service == "sync:":
+                    conn.sendall(b"OKAY")
+                    self._sync(conn)
+                else:
+                    self._fail(conn, "unknown service")
+                break
+        except (EOFError, OSError):
+            pass
+        conn.close()
+
+    def _exec_sh(self, conn):
+        conn.sendall(b"OKAY")
+        proc = subprocess.Popen(["sh"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        with self._lock:
+            self._shells.append((conn, proc))
+
+        def pump_out():
+            for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+                try:
+                    conn.sendall(chunk)
+                except OSError:
+                    break
+
+        threading.Thread(target=pump_out, daemon=True).start()
+        try:
+            for chunk in iter(lambda: conn.recv(65536), b""):
+                proc.stdin.write(chunk)
+                proc.stdin.flush()
+        except OSError:
+            pass
+        proc.kill()
+        proc.wait()
+        conn.close()
+
+    def _sync(self, conn):
+        while True:
+            cmd = self._read(conn, 4)
+            path = self._read(conn, struct.unpack("<I", self._read(conn, 4))[0]).decode()
+            if cmd == b"QUIT":
+                return
+            if cmd == b"STAT":
+                if path in self.files:
+                    mode, mtime, data = self.files[path]
+                    reply = (mode, len(data), mtime)
+                else:
+                    reply = (self.dirs.get(path, 0), 0, 0)
+                conn.sendall(b"STAT" + struct.pack("<III", *reply))
+            elif cmd == b"LIST":
+                for name in (".", ".."):
+                    conn.sendall(b"DENT" + struct.pack("<IIII", 0o40755, 0, 0, len(name)) + name.encode())
+                for file_path, (mode, mtime, data) in sorted(self.files.items()):
+                    parent, _, name = file_path.rpartition("/")
+                    if parent == path.rstrip("/"):
+                        conn.sendall(b"DENT" + struct.pack("<IIII", mode, len(data), mtime, len(name)) + name.encode())
+                conn.sendall(b"DONE" + b"\0" * 16)
+            elif cmd == b"RECV":
+                if path not in self.files:
+                    message = b"open failed: No such file or directory"
+                    conn.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    continue
+                data = self.files[path][2]
+                for start in range(0, len(data), 65536):
+                    chunk = data[start:start + 65536]
+                    conn.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                conn.sendall(b"DONE" + b"\0" * 4)
+            elif cmd == b"SEND":
+                remote, mode = path.rsplit(",", 1)
+                data = b""
+                while True:
+                    ident, length = struct.unpack("<4sI", self._read(conn, 8))
+                    if ident == b"DONE":
+                        break
+                    data += self._read(conn, length)
+                self.files[remote] = (int(mode), length, data)
+                conn.sendall(b"OKAY" + b"\0" * 4)
+
+
+class FakeServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeAdbServer()
+        self.client = AdbClient("127.0.0.1", self.server.port)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+
+class SmartSocketTest(FakeServerTestCase):
+    def test_devices(self):
+        self.assertEqual(self.client.devices(), [(SERIAL, "device")])
+
+    def test_version(self):
+        self.assertEqual(self.client.version(), 41)
+
+    def test_fail_carries_server_message(self):
+        with self.assertRaisesRegex(AdbError, "device 'nosuch' not found"):
+            self.client.shell("nosuch", "true")
+        with self.assertRaisesRegex(AdbError, "unknown service"):
+            self.client.host_request("host:bogus")
+
+    def test_shell_undoes_pty_crlf(self):
+        self.server.shell_replies["getprop ro.build.version.sdk"] = "23\n"
+        self.assertEqual(self.client.shell(SERIAL, "getprop ro.build.version.sdk"), "23\n")
+        self.assertEqual(self.server.requests[-2:], [f"host:transport:{SERIAL}", "shell:getprop ro.build.version.sdk"])
+
+    def test_parse_device_list(self):
+        text = "emulator-5554\tdevice\n192.168.1.5:5555\toffline\nnoise\n"
+        self.assertEqual(parse_device_list(text), [("emulator-5554", "device"), ("192.168.1.5:5555", "offline")])
+
+
+@unittest.skipUnless(shutil.which("sh"), "needs a local sh for exec:sh")
+class ShellSessionTest(FakeServerTestCase):
+    def test_exit_codes_and_output(self):
+        session = self.client.shell_session(SERIAL)
+        self.assertEqual(session.run("echo hello"), (0, "hello\n"))
+        self.assertEqual(session.run("echo oops >&2; exit 3"), (3, "oops\n"))
+        self.assertEqual(session.run("printf 'no newline'"), (0, "no newline"))
+        # All of it over one connection
+        self.assertEqual(self.server.requests.count("exec:sh"), 1)
+
+    def test_command_cannot_read_following_requests(self):
+        session = self.client.shell_session(SERIAL)
+        self.assertEqual(session.run("cat"), (0, ""))
+        self.assertEqual(session.run("echo still here"), (0, "still here\n"))
+
+    def test_large_output(self):
+        rc, out = self.client.shell_session(SERIAL).run("head -c 1200000 /dev/zero | tr '\\0' a", timeout=30)
+        self.assertEqual(rc, 0)
+        self.assertEqual(out, "a" * 1200000)
+
+    def test_reconnects_after_disconnect(self):
+        session = self.client.shell_session(SERIAL)
+        self.assertEqual(session.run("echo one"), (0, "one\n"))
+        self.server.drop_shells()
+        self.assertEqual(session.run("echo two"), (0, "two\n"))
+        self.assertEqual(self.server.requests.count("exec:sh"), 2)
+
+    def test_timeout_is_raised_and_session_reopened(self):
+        session = self.client.shell_session(SERIAL)
+        with self.assertRaises(socket.timeout):
+            session.run("sleep 2", timeout=0.2)
+        self.assertEqual(session.run("echo after"), (0, "after\n"))
+
+
+class SyncTest(FakeServerTestCase):
+    def test_push_stat_list_pull(self):
+        data = bytes(range(256)) * 1000  # Spans several DATA chunks
+        with self.client.sync(SERIAL) as sync:
+            self.assertEqual(sync.push(io.BytesIO(data), "/sdcard/a.bin", mtime=1700000000), len(data))
+            entry = sync.stat("/sdcard/a.bin")
+            self.assertEqual((entry.name, entry.size, entry.mtime), ("a.bin", len(data), 1700000000))
+            self.assertTrue(stat_mod.S_ISREG(entry.mode))
+            self.assertEqual([e.name for e in sync.list("/sdcard")], ["a.bin"])
+            out = io.BytesIO()
+            self.assertEqual(sync.pull("/sdcard/a.bin", out), len(data))
+        self.assertEqual(out.getvalue(), data)
+
+    def test_stat_missing_and_dir(self):
+        with self.client.sync(SERIAL) as sync:
+            self.assertFalse(sync.stat("/sdcard/missing").exists)
+            self.assertTrue(sync.stat("/sdcard").is_dir)
+            self.assertEqual([e.exists for e in sync.stat_many(["/sdcard", "/nope"])], [True, False])
+
+    def test_recv_fail(self):
+        with self.assertRaisesRegex(AdbError, "No such file"):
+            with self.client.sync(SERIAL) as sync:
+                sync.pull("/sdcard/missing", io.BytesIO())
+
+    def test_sessions_are_pooled(self):
+        for _ in range(3):
+            with self.client.sync(SERIAL) as sync:
+                sync.stat("/sdcard")
+        self.assertEqual(self.server.requests.count("sync:"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()